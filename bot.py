@@ -1,17 +1,33 @@
 import asyncio
+import functools
+import heapq
+import itertools
 import logging
-from datetime import datetime, timedelta
+import logging.handlers
+import os
+import queue
+import time
+from datetime import date, datetime, timedelta
 from typing import Optional, List, Tuple, Dict, Any
-from contextlib import suppress
+from contextlib import suppress, asynccontextmanager
 import re
 
-from aiogram import Bot, Dispatcher, F
+from aiogram import Bot, Dispatcher, F, Router
 from aiogram.types import *
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.default import DefaultBotProperties
+from aiogram.enums import ParseMode
 import aiosqlite
 
+try:
+    import ahocorasick  # pyahocorasick, необязательная зависимость
+except ImportError:
+    ahocorasick = None
+
 # Import configuration
 from config import (
     BOT_TOKEN,
@@ -28,170 +44,438 @@ from config import (
 )
 
 # ================== INIT ==================
-bot = Bot(BOT_TOKEN)
+# Пул соединений с Bot API: одно решение модератора даёт несколько запросов подряд,
+# плюс рассылки — запас соединений избавляет от ожидания свободного сокета и TLS-рукопожатий
+BOT_HTTP_POOL_LIMIT = 200
+# HTML — режим разметки по умолчанию для всех сообщений бота. Тексты пользователей
+# (посты, рассылки с entities) отправляются с явным parse_mode=None
+bot = Bot(
+    BOT_TOKEN,
+    session=AiohttpSession(limit=BOT_HTTP_POOL_LIMIT),
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML),
+)
 dp = Dispatcher()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def start_queue_logging() -> logging.handlers.QueueListener:
+    """Переводит корневой логгер на очередь: запись в stderr/файлы идёт в отдельном потоке,
+    а не в event loop. Возвращает запущенный QueueListener — его нужно остановить при выходе."""
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    log_records = queue.SimpleQueue()
+    for handler in handlers:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(log_records))
+    listener = logging.handlers.QueueListener(log_records, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
+
+# Множества для проверок принадлежности на каждом событии (поиск по хэшу вместо списка)
+ADMINS_SET = frozenset(ADMINS)
+GROUP_CHAT_TYPES = frozenset(("group", "supergroup"))
+STAFF_CHAT_IDS = frozenset((MODERATORS_CHAT_ID, ADMINS_CHAT_ID))
+
+# Обработчики админ-панели зарегистрированы в отдельном роутере: фильтр роутера отсекает
+# остальных пользователей один раз, до фильтров отдельных обработчиков. Роутеры проверяются
+# после обработчиков dp, с фильтрами которых админские не пересекаются.
+admin_router = Router(name="admin")
+admin_router.message.filter(F.from_user.id.in_(ADMINS_SET))
+admin_router.callback_query.filter(F.from_user.id.in_(ADMINS_SET))
+# Нажатия админских кнопок остальными пользователями получают отказ, а не бесконечную загрузку
+admin_denied_router = Router(name="admin_denied")
+admin_denied_router.callback_query.filter(~F.from_user.id.in_(ADMINS_SET))
+dp.include_routers(admin_router, admin_denied_router)
+
 # ================== ВАЛИДАЦИЯ ЧАТА И ТЕМЫ ==================
+# Допустимые темы: сообщения без темы (обычная группа) или из нужной темы форума
+MODERATORS_THREADS = frozenset((None, MODERATORS_TOPIC_ID))
+ADMINS_THREADS = frozenset((None, ADMINS_TOPIC_ID))
+
 def is_valid_moderators_chat(message: Message) -> bool:
     """Проверяет, что сообщение из правильной темы группы модераторов"""
-    if message.chat.id != MODERATORS_CHAT_ID:
-        return False
-    
-    if message.message_thread_id is not None and message.message_thread_id != MODERATORS_TOPIC_ID:
-        return False
-    
-    return True
+    return message.chat.id == MODERATORS_CHAT_ID and message.message_thread_id in MODERATORS_THREADS
 
 def is_valid_admins_chat(message: Message) -> bool:
     """Проверяет, что сообщение из правильной темы группы администраторов"""
-    if message.chat.id != ADMINS_CHAT_ID:
-        return False
-    
-    if message.message_thread_id is not None and message.message_thread_id != ADMINS_TOPIC_ID:
-        return False
-    
-    return True
+    return message.chat.id == ADMINS_CHAT_ID and message.message_thread_id in ADMINS_THREADS
 
-async def validate_chat_for_moderation(callback: CallbackQuery) -> bool:
+def validate_chat_for_moderation(callback: CallbackQuery) -> bool:
     """Проверяет, что колбэк из правильной темы для модерации"""
-    if callback.message.chat.id != MODERATORS_CHAT_ID:
-        return False
-    
-    if callback.message.message_thread_id is not None:
-        return callback.message.message_thread_id == MODERATORS_TOPIC_ID
-    
-    return True
+    return is_valid_moderators_chat(callback.message)
 
-async def validate_chat_for_admin_actions(callback: CallbackQuery) -> bool:
+def validate_chat_for_admin_actions(callback: CallbackQuery) -> bool:
     """Проверяет, что колбэк из правильной темы для админ-действий"""
-    if callback.message.chat.id != ADMINS_CHAT_ID:
-        return False
-    
-    if callback.message.message_thread_id is not None:
-        return callback.message.message_thread_id == ADMINS_TOPIC_ID
-    
-    return True
+    return is_valid_admins_chat(callback.message)
 
 # ================== DB ==================
+# Формат хранения времени в БД: без микросекунд, сортируется как строка
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def now_str() -> str:
+    """Текущее время в формате TIME_FORMAT для записи в БД"""
+    return datetime.now().strftime(TIME_FORMAT)
+
+def now_ms() -> int:
+    """Текущее время в миллисекундах с начала эпохи — для числовых столбцов времени"""
+    return int(time.time() * 1000)
+
+@functools.lru_cache(maxsize=1)
+def day_bounds(day: date) -> Tuple[str, str]:
+    """Границы дня [day, day+1) для сравнения со строковыми столбцами времени вместо date(...).
+    Меняются раз в сутки, поэтому строки собираются один раз на дату."""
+    return day.isoformat(), (day + timedelta(days=1)).isoformat()
+
+@functools.lru_cache(maxsize=1024)
+def format_db_time(value: Optional[str], fmt: str) -> Optional[str]:
+    """Время из БД в формате fmt для вывода; нераспознанное значение возвращается как есть.
+    Одни и те же строки показываются много раз (списки, логи), поэтому результат кэшируется."""
+    try:
+        return datetime.fromisoformat(value).strftime(fmt)
+    except (TypeError, ValueError):
+        return value
+
+# Единое соединение на всё время работы бота (autocommit), открывается в init_db()
+db: Optional[aiosqlite.Connection] = None
+# Сериализует все записи на общем соединении: явные транзакции (transaction()) и одиночные запросы (writer())
+db_lock: Optional[asyncio.Lock] = None
+
+DB_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "busy_timeout=5000",
+    "cache_size=-20000",
+    "temp_store=memory",
+    # Чтение страниц через отображение файла в память (256 МБ) вместо read() в кэш страниц
+    "mmap_size=268435456",
+    "foreign_keys=ON",
+)
+
+# Размер кэша подготовленных выражений sqlite3 на каждое соединение (по умолчанию 128)
+DB_CACHED_STATEMENTS = 256
+
+# Частые запросы вынесены в константы: один и тот же текст SQL позволяет sqlite3
+# переиспользовать подготовленное выражение из кэша соединения
+SQL_INSERT_LOG = "INSERT INTO logs(action,data,time) VALUES(?,?,?)"
+SQL_USER_EXISTS = "SELECT 1 FROM users WHERE user_id=?"
+SQL_INSERT_USER = "INSERT INTO users(user_id, username, reg_date, is_subscribed) VALUES(?,?,?,?)"
+SQL_GET_SUBSCRIPTION_STATUS = "SELECT is_subscribed FROM users WHERE user_id=?"
+SQL_SET_SUBSCRIPTION_STATUS = "UPDATE users SET is_subscribed=? WHERE user_id=?"
+SQL_POSTS_SINCE = "SELECT COUNT(*) FROM posts WHERE user_id=? AND time>=?"
+SQL_GET_POST_STATUS = "SELECT status FROM posts WHERE id=?"
+SQL_INSERT_POST = (
+    "INSERT INTO posts(user_id, text, photo, photo_unique_id, has_photo, time, status) "
+    "VALUES(?,?,?,?,?,?,'moderation')"
+)
+SQL_SET_MODERATORS_MESSAGE = "UPDATE posts SET message_id_moderators=?, chat_id_moderators=? WHERE id=?"
+SQL_SET_ADMINS_MESSAGE = "UPDATE posts SET message_id_admins=?, chat_id_admins=? WHERE id=?"
+# Смена статуса только для поста на модерации: проверка и запись одним выражением,
+# два модератора не смогут обработать один пост одновременно
+SQL_CLAIM_PUBLISH = (
+    "UPDATE posts SET status='published', moderator_id=?, moderated_at=? "
+    "WHERE id=? AND status='moderation' RETURNING text, photo, user_id"
+)
+SQL_CLAIM_REJECT = (
+    "UPDATE posts SET status='rejected', moderator_id=?, moderated_at=?, reject_reason=? "
+    "WHERE id=? AND status='moderation' RETURNING user_id"
+)
+# Статистика админ-панели: все счётчики по таблице одним проходом.
+# «Сегодня» задаётся границами дня [?, ?) — сравнение строк вместо вызова date() на каждую строку
+SQL_POSTS_STATS = (
+    "SELECT COUNT(*), "
+    "COUNT(*) FILTER (WHERE status='published'), "
+    "COUNT(*) FILTER (WHERE status='moderation'), "
+    "COUNT(*) FILTER (WHERE status='rejected'), "
+    "COUNT(*) FILTER (WHERE time>=? AND time<?) "
+    "FROM posts"
+)
+SQL_USERS_STATS = "SELECT COUNT(*), COUNT(*) FILTER (WHERE reg_date>=? AND reg_date<?) FROM users"
+SQL_RELEASE_POST = (
+    "UPDATE posts SET status='moderation', moderator_id=NULL, moderated_at=NULL "
+    "WHERE id=? AND status='published'"
+)
+
+async def apply_pragmas(conn: aiosqlite.Connection):
+    """Настройки SQLite для соединения: WAL вместо rollback-журнала, без fsync на каждый коммит"""
+    for pragma in DB_PRAGMAS:
+        await conn.execute(f"PRAGMA {pragma}")
+
+class ReaderPool:
+    """Пул соединений только для чтения.
+
+    Все записи идут через единственное соединение ``db``, а чтения берут
+    свободное соединение из пула: в режиме WAL читатели не ждут писателя
+    и выполняются параллельно в своих потоках aiosqlite.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._queue: Optional[asyncio.Queue] = None
+        self._connections: List[aiosqlite.Connection] = []
+
+    async def open(self):
+        self._queue = asyncio.Queue()
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(
+                f"file:{self.path}?mode=ro", uri=True, isolation_level=None,
+                cached_statements=DB_CACHED_STATEMENTS
+            )
+            await apply_pragmas(conn)
+            self._connections.append(conn)
+            self._queue.put_nowait(conn)
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await self._queue.get()
+        try:
+            yield conn
+        finally:
+            self._queue.put_nowait(conn)
+
+    async def fetchone(self, sql: str, params: tuple = ()):
+        """Одна строка результата на свободном соединении; независимые запросы можно запускать через gather"""
+        async with self.acquire() as conn:
+            async with conn.execute(sql, params) as cur:
+                return await cur.fetchone()
+
+    async def close(self):
+        for conn in self._connections:
+            await conn.close()
+        self._connections.clear()
+
+# Больше соединений чтения не ускоряет SQLite, а лишь держит лишние дескрипторы и кэши страниц
+DB_READERS_MAX = 4
+db_readers = ReaderPool(DB_NAME, size=min(os.cpu_count() or DB_READERS_MAX, DB_READERS_MAX))
+
+@asynccontextmanager
+async def transaction():
+    """Явная транзакция BEGIN IMMEDIATE ... COMMIT на соединении записи"""
+    async with db_lock:
+        await db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            await db.execute("ROLLBACK")
+            raise
+        await db.execute("COMMIT")
+
+@asynccontextmanager
+async def writer():
+    """Одиночная запись на соединении db под db_lock, чтобы она не попала внутрь чужой transaction()"""
+    async with db_lock:
+        yield db
+
 async def init_db():
     """Инициализация базы данных"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS users(
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            reg_date TEXT,
-            is_subscribed INTEGER DEFAULT 0
-        )""")
-        
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS posts(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            text TEXT,
-            photo TEXT,
-            time TEXT,
-            status TEXT DEFAULT 'moderation',
-            moderator_id INTEGER,
-            moderation_time TEXT,
-            reject_reason TEXT,
-            message_id_moderators INTEGER,
-            message_id_admins INTEGER,
-            chat_id_moderators INTEGER,
-            chat_id_admins INTEGER
-        )""")
-        
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS bans(
-            user_id INTEGER PRIMARY KEY,
-            reason TEXT,
-            ban_time TEXT,
-            admin_id INTEGER,
-            admin_username TEXT
-        )""")
-        
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS publication_blacklist(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            keyword TEXT UNIQUE,
-            added_by INTEGER,
-            added_time TEXT
-        )""")
-        
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS logs(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            action TEXT,
-            data TEXT,
-            time TEXT
-        )""")
-        
-        await db.execute("""
-        CREATE TABLE IF NOT EXISTS required_subscriptions(
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            sub_type TEXT NOT NULL,
-            sub_id TEXT NOT NULL,
-            username TEXT NOT NULL,
-            name TEXT NOT NULL,
-            url TEXT NOT NULL,
-            added_by INTEGER,
-            added_time TEXT,
-            UNIQUE(sub_type, sub_id)
-        )""")
-        
-        await db.commit()
-        logger.info("База данных инициализирована")
-        await load_subscriptions_from_db()
+    global db, db_lock
+    db = await aiosqlite.connect(DB_NAME, isolation_level=None, cached_statements=DB_CACHED_STATEMENTS)
+    db_lock = asyncio.Lock()
+    await apply_pragmas(db)
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS users(
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        reg_date TEXT,
+        is_subscribed INTEGER DEFAULT 0
+    )""")
+    # Покрывающий индекс для счётчика регистраций в статистике: обход индекса вместо таблицы
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_users_reg_date ON users(reg_date)")
+    
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS posts(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        text TEXT,
+        photo TEXT,
+        time TEXT,
+        status TEXT DEFAULT 'moderation',
+        moderator_id INTEGER,
+        moderation_time TEXT,
+        reject_reason TEXT,
+        message_id_moderators INTEGER,
+        message_id_admins INTEGER,
+        chat_id_moderators INTEGER,
+        chat_id_admins INTEGER,
+        has_photo INTEGER DEFAULT 0,
+        photo_unique_id TEXT,
+        moderated_at INTEGER
+    )""")
+    
+    # Миграция: флаг наличия фото, чтобы не выбирать file_id только ради выбора способа редактирования
+    with suppress(aiosqlite.OperationalError):
+        await db.execute("ALTER TABLE posts ADD COLUMN has_photo INTEGER DEFAULT 0")
+        await db.execute("UPDATE posts SET has_photo = photo IS NOT NULL")
+    
+    # Миграция: file_unique_id фото одинаков для всех копий файла — задел для поиска повторов
+    with suppress(aiosqlite.OperationalError):
+        await db.execute("ALTER TABLE posts ADD COLUMN photo_unique_id TEXT")
+    
+    # Миграция: время модерации хранится числом (мс с начала эпохи) вместо строки moderation_time.
+    # Старые строки записаны в локальном времени, модификатор 'utc' переводит их в UTC.
+    with suppress(aiosqlite.OperationalError):
+        await db.execute("ALTER TABLE posts ADD COLUMN moderated_at INTEGER")
+        await db.execute(
+            "UPDATE posts SET moderated_at = CAST(strftime('%s', moderation_time, 'utc') AS INTEGER) * 1000 "
+            "WHERE moderation_time IS NOT NULL"
+        )
+    
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_user_time ON posts(user_id, time)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_status ON posts(status)")
+    # Покрывающий индекс для SQL_POSTS_STATS: агрегаты считаются без чтения текста постов
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_posts_status_time ON posts(status, time)")
+    
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS bans(
+        user_id INTEGER PRIMARY KEY,
+        reason TEXT,
+        ban_time TEXT,
+        admin_id INTEGER,
+        admin_username TEXT
+    )""")
+    
+    # Миграция старых БД, где таблица bans создавалась без данных об администраторе
+    for column in ("admin_id INTEGER", "admin_username TEXT"):
+        with suppress(aiosqlite.OperationalError):
+            await db.execute(f"ALTER TABLE bans ADD COLUMN {column}")
+    
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS publication_blacklist(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        keyword TEXT UNIQUE,
+        added_by INTEGER,
+        added_time TEXT
+    )""")
+    
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS logs(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        action TEXT,
+        data TEXT,
+        time TEXT
+    )""")
+    
+    await db.execute("""
+    CREATE TABLE IF NOT EXISTS required_subscriptions(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        sub_type TEXT NOT NULL,
+        sub_id TEXT NOT NULL,
+        username TEXT NOT NULL,
+        name TEXT NOT NULL,
+        url TEXT NOT NULL,
+        added_by INTEGER,
+        added_time TEXT,
+        UNIQUE(sub_type, sub_id)
+    )""")
+    
+    # Читатели открываются после создания схемы: mode=ro не может создать файл БД
+    await db_readers.open()
+    
+    logger.info("База данных инициализирована")
+    await load_subscriptions_from_db()
+    await load_bans_from_db()
+    await load_blacklist_from_db()
+    await load_posts_today_from_db()
+    await load_users_count_from_db()
+    start_log_writer()
+
+async def close_db():
+    """Закрывает соединение с базой данных при остановке бота"""
+    await stop_log_writer()
+    await db_readers.close()
+    if db is not None:
+        await db.close()
+        logger.info("Соединение с базой данных закрыто")
+
+SUBSCRIPTION_EMOJI = {"channel": "📢", "group": "👥", "bot": "🤖"}
+
+# Подписки, которые можно проверить (без ботов), с заранее разобранным ID чата:
+# int для числовых ID или строка-username. Пересобирается при каждом изменении списка.
+SUBSCRIPTION_CHATS: List[Tuple[Any, Dict[str, Any]]] = []
+
+# Индексы для проверки дубликатов при добавлении: (type, id) -> sub и (type, username) -> sub
+SUBSCRIPTIONS_BY_ID: Dict[Tuple[str, str], Dict[str, Any]] = {}
+SUBSCRIPTIONS_BY_USERNAME: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+# Клавиатуры подписки по набору неподписанных ресурсов ((type, id), ...); сбрасываются вместе со списком
+SUBSCRIPTION_KB_CACHE: Dict[Tuple[Tuple[str, str], ...], InlineKeyboardMarkup] = {}
+
+def refresh_subscription_chats():
+    """Пересобирает SUBSCRIPTION_CHATS и индексы из REQUIRED_SUBSCRIPTIONS, проставляет эмодзи подпискам"""
+    global SUBSCRIPTION_CHATS, SUBSCRIPTIONS_BY_ID, SUBSCRIPTIONS_BY_USERNAME
+    chats = []
+    SUBSCRIPTIONS_BY_ID = {(sub["type"], str(sub["id"])): sub for sub in REQUIRED_SUBSCRIPTIONS}
+    SUBSCRIPTIONS_BY_USERNAME = {(sub["type"], sub["username"]): sub for sub in REQUIRED_SUBSCRIPTIONS}
+    for sub in REQUIRED_SUBSCRIPTIONS:
+        sub["emoji"] = SUBSCRIPTION_EMOJI.get(sub["type"], "🤖")
+        if sub["type"] == "bot":
+            continue
+        try:
+            chat_id = int(sub["id"])
+        except ValueError:
+            chat_id = sub["id"]
+        chats.append((chat_id, sub))
+    SUBSCRIPTION_CHATS = chats
+    # Список подписок изменился — ранее подтверждённые подписки нужно перепроверить
+    SUBSCRIBED_USERS.clear()
+    MEMBERSHIP_CACHE.clear()
+    SUBSCRIPTION_KB_CACHE.clear()
+
+def is_subscription_added(sub_type: str, sub_id: Any, username: str) -> bool:
+    """Есть ли уже подписка этого типа с таким ID или юзернеймом"""
+    return (sub_type, str(sub_id)) in SUBSCRIPTIONS_BY_ID or (sub_type, username) in SUBSCRIPTIONS_BY_USERNAME
+
+# Пользователи с недавно подтверждённой подпиской: user_id -> time.monotonic() проверки.
+# Пока запись свежая, middleware не запрашивает у Telegram статус участника каналов.
+SUBSCRIPTION_CACHE_TTL = 300
+SUBSCRIBED_USERS: Dict[int, float] = {}
+
+def is_subscription_cached(user_id: int) -> bool:
+    checked_at = SUBSCRIBED_USERS.get(user_id)
+    return checked_at is not None and time.monotonic() - checked_at < SUBSCRIPTION_CACHE_TTL
 
 async def load_subscriptions_from_db():
     """Загружаем список обязательных подписок из базы данных"""
     global REQUIRED_SUBSCRIPTIONS
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("""
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall("""
             SELECT sub_type, sub_id, username, name, url 
             FROM required_subscriptions 
             ORDER BY id
         """)
-        rows = await cur.fetchall()
-        
-        if rows:
-            REQUIRED_SUBSCRIPTIONS = []
-            for row in rows:
-                REQUIRED_SUBSCRIPTIONS.append({
-                    "type": row[0],
-                    "id": row[1],
-                    "username": row[2],
-                    "name": row[3],
-                    "url": row[4]
-                })
-            logger.info(f"Загружено {len(REQUIRED_SUBSCRIPTIONS)} обязательных подписок из БД")
-        else:
-            await save_subscriptions_to_db()
+    
+    if rows:
+        REQUIRED_SUBSCRIPTIONS = []
+        for row in rows:
+            REQUIRED_SUBSCRIPTIONS.append({
+                "type": row[0],
+                "id": row[1],
+                "username": row[2],
+                "name": row[3],
+                "url": row[4]
+            })
+        refresh_subscription_chats()
+        logger.info("Загружено %s обязательных подписок из БД", len(REQUIRED_SUBSCRIPTIONS))
+    else:
+        await save_subscriptions_to_db()
 
 async def save_subscriptions_to_db():
     """Сохраняем текущий список подписок в базу данных"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("DELETE FROM required_subscriptions")
-        
-        for sub in REQUIRED_SUBSCRIPTIONS:
-            sub_id = str(sub["id"])
-            
-            await db.execute("""
-                INSERT INTO required_subscriptions(sub_type, sub_id, username, name, url, added_time)
-                VALUES(?,?,?,?,?,?)
-            """, (
-                sub["type"],
-                sub_id,
-                sub["username"],
-                sub["name"],
-                sub["url"],
-                str(datetime.now())
-            ))
-        
-        await db.commit()
-        logger.info(f"Сохранено {len(REQUIRED_SUBSCRIPTIONS)} подписок в БД")
+    added_time = now_str()
+    rows = [
+        (sub["type"], str(sub["id"]), sub["username"], sub["name"], sub["url"], added_time)
+        for sub in REQUIRED_SUBSCRIPTIONS
+    ]
+    
+    async with transaction() as conn:
+        await conn.execute("DELETE FROM required_subscriptions")
+        await conn.executemany("""
+            INSERT INTO required_subscriptions(sub_type, sub_id, username, name, url, added_time)
+            VALUES(?,?,?,?,?,?)
+        """, rows)
+    
+    refresh_subscription_chats()
+    logger.info("Сохранено %s подписок в БД", len(REQUIRED_SUBSCRIPTIONS))
 
 # ================== STATES ==================
 class PostState(StatesGroup):
@@ -221,424 +505,552 @@ class AdminPostState(StatesGroup):
     wait_reject_confirm = State()
 
 # ================== UTILS ==================
-async def check_subscription(user_id: int) -> Tuple[bool, List[Dict[str, Any]]]:
-    """Проверяет подписку пользователя на обязательные каналы и группы."""
-    if not REQUIRED_SUBSCRIPTIONS:
-        return True, []
+async def is_subscribed_to(chat_id: Any, sub: Dict[str, Any], user_id: int) -> bool:
+    """Проверяет подписку пользователя на один канал или группу."""
+    if isinstance(chat_id, str):
+        # Если ID не число, пробуем получить чат по username
+        try:
+            chat = await bot.get_chat(chat_id=chat_id)
+            chat_member = await bot.get_chat_member(chat_id=chat.id, user_id=user_id)
+            return chat_member.status in ["member", "administrator", "creator"]
+        except Exception as e:
+            logger.error("Ошибка при проверке подписки на %s %s: %s", sub['type'], sub['id'], e)
+            return False
     
-    unsubscribed = []
+    try:
+        chat_member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+        
+        if chat_member.status in ["member", "administrator", "creator"]:
+            logger.debug("Пользователь %s подписан на %s %s", user_id, sub['type'], sub['name'])
+            return True
+        
+        logger.debug("Пользователь %s НЕ подписан на %s %s (статус: %s)", user_id, sub['type'], sub['name'], chat_member.status)
+        return False
+        
+    except TelegramForbiddenError:
+        logger.error("Бот не имеет прав для проверки %s %s (ID: %s)", sub['type'], sub['name'], chat_id)
+        # Если бот не может проверить, считаем что пользователь не подписан
+        return False
+        
+    except Exception as e:
+        logger.error("Ошибка при проверке подписки на %s %s: %s", sub['type'], sub['id'], e)
+        return False
+
+# Положительные результаты getChatMember на короткое время: (user_id, chat_id) -> time.monotonic().
+# Отрицательные не кэшируются, чтобы только что подписавшийся пользователь проходил сразу.
+# Одновременные проверки одной пары ждут один общий запрос вместо повторных обращений к API.
+MEMBERSHIP_CACHE_TTL = 60
+MEMBERSHIP_CACHE_MAX = 10000
+MEMBERSHIP_CACHE: Dict[Tuple[int, Any], float] = {}
+MEMBERSHIP_INFLIGHT: Dict[Tuple[int, Any], asyncio.Future] = {}
+
+async def cached_is_subscribed_to(chat_id: Any, sub: Dict[str, Any], user_id: int, use_cache: bool = True) -> bool:
+    key = (user_id, chat_id)
+    now = time.monotonic()
+    
+    if use_cache:
+        checked_at = MEMBERSHIP_CACHE.get(key)
+        if checked_at is not None and now - checked_at < MEMBERSHIP_CACHE_TTL:
+            return True
     
-    for sub in REQUIRED_SUBSCRIPTIONS:
-        # Пропускаем ботов, так как на них нельзя подписаться
-        if sub["type"] == "bot":
-            continue
-            
-        try:
-            chat_id = int(sub["id"])
-            
-            try:
-                chat_member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
-                
-                if chat_member.status in ["member", "administrator", "creator"]:
-                    logger.info(f"Пользователь {user_id} подписан на {sub['type']} {sub['name']}")
-                    continue
-                else:
-                    logger.info(f"Пользователь {user_id} НЕ подписан на {sub['type']} {sub['name']} (статус: {chat_member.status})")
-                    unsubscribed.append(sub)
-                    
-            except TelegramForbiddenError:
-                logger.error(f"Бот не имеет прав для проверки {sub['type']} {sub['name']} (ID: {chat_id})")
-                # Если бот не может проверить, считаем что пользователь не подписан
-                unsubscribed.append(sub)
-                
-            except Exception as e:
-                logger.error(f"Ошибка при проверке подписки на {sub['type']} {sub['id']}: {e}")
-                unsubscribed.append(sub)
-                
-        except ValueError:
-            # Если ID не число, пробуем получить чат по username
-            try:
-                chat = await bot.get_chat(chat_id=sub["id"])
-                actual_chat_id = chat.id
-                
-                chat_member = await bot.get_chat_member(chat_id=actual_chat_id, user_id=user_id)
-                if chat_member.status in ["member", "administrator", "creator"]:
-                    continue
-                else:
-                    unsubscribed.append(sub)
-            except Exception as e:
-                logger.error(f"Ошибка при проверке подписки на {sub['type']} {sub['id']}: {e}")
-                unsubscribed.append(sub)
+    inflight = MEMBERSHIP_INFLIGHT.get(key)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+    
+    future = asyncio.get_running_loop().create_future()
+    MEMBERSHIP_INFLIGHT[key] = future
+    try:
+        result = await is_subscribed_to(chat_id, sub, user_id)
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        del MEMBERSHIP_INFLIGHT[key]
+    future.set_result(result)
+    
+    if not result:
+        MEMBERSHIP_CACHE.pop(key, None)
+        return False
+    
+    if len(MEMBERSHIP_CACHE) >= MEMBERSHIP_CACHE_MAX:
+        for stale_key in [k for k, checked_at in MEMBERSHIP_CACHE.items() if now - checked_at >= MEMBERSHIP_CACHE_TTL]:
+            del MEMBERSHIP_CACHE[stale_key]
+    MEMBERSHIP_CACHE[key] = time.monotonic()
+    return True
+
+async def check_subscription(user_id: int, use_cache: bool = True) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Проверяет подписку пользователя на обязательные каналы и группы.
+
+    use_cache=False заново спрашивает Telegram (кнопка «Я подписался»).
+    """
+    if not SUBSCRIPTION_CHATS:
+        return True, []
+    
+    # Запросы к Telegram независимы, поэтому выполняем их параллельно
+    results = await asyncio.gather(*(
+        cached_is_subscribed_to(chat_id, sub, user_id, use_cache) for chat_id, sub in SUBSCRIPTION_CHATS
+    ))
+    unsubscribed = [sub for (_, sub), subscribed in zip(SUBSCRIPTION_CHATS, results) if not subscribed]
     
     return len(unsubscribed) == 0, unsubscribed
 
 def get_subscription_keyboard(unsubscribed: List[Dict[str, Any]] = None) -> InlineKeyboardMarkup:
     """Создает клавиатуру для подписки на каналы/группы."""
     if unsubscribed is None:
-        subscriptions_to_show = [sub for sub in REQUIRED_SUBSCRIPTIONS if sub["type"] != "bot"]
+        subscriptions_to_show = [sub for _, sub in SUBSCRIPTION_CHATS]
     else:
         subscriptions_to_show = unsubscribed
     
-    keyboard = []
+    # Набор неподписанных ресурсов повторяется у многих пользователей — клавиатуру собираем один раз
+    key = tuple((sub["type"], str(sub["id"])) for sub in subscriptions_to_show)
+    cached = SUBSCRIPTION_KB_CACHE.get(key)
+    if cached is not None:
+        return cached
     
-    for sub in subscriptions_to_show:
-        if sub["type"] == "channel":
-            emoji = "📢"
-        else:  # group
-            emoji = "👥"
-        
-        keyboard.append([
-            InlineKeyboardButton(
-                text=f"{emoji} {sub['name']}",
-                url=sub["url"]
-            )
-        ])
+    keyboard = [
+        [InlineKeyboardButton(text=f"{sub['emoji']} {sub['name']}", url=sub["url"])]
+        for sub in subscriptions_to_show
+    ]
     
     if subscriptions_to_show:
         keyboard.append([
             InlineKeyboardButton(text="✅ Я подписался", callback_data="check_subscription")
         ])
     
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    markup = SUBSCRIPTION_KB_CACHE[key] = InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return markup
 
 async def update_user_subscription_status(user_id: int, is_subscribed: bool):
     """Обновляет статус подписки пользователя в базе данных"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE users SET is_subscribed=? WHERE user_id=?",
-            (1 if is_subscribed else 0, user_id)
-        )
-        await db.commit()
+    async with writer() as conn:
+        await conn.execute(SQL_SET_SUBSCRIPTION_STATUS, (1 if is_subscribed else 0, user_id))
+    if is_subscribed:
+        SUBSCRIBED_USERS[user_id] = time.monotonic()
+    else:
+        SUBSCRIBED_USERS.pop(user_id, None)
 
 async def get_user_subscription_status(user_id: int) -> bool:
     """Получает статус подписки пользователя из базы данных"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT is_subscribed FROM users WHERE user_id=?",
-            (user_id,)
-        )
-        row = await cur.fetchone()
+    if is_subscription_cached(user_id):
+        return True
+    async with db_readers.acquire() as conn:
+        async with conn.execute(SQL_GET_SUBSCRIPTION_STATUS, (user_id,)) as cur:
+            row = await cur.fetchone()
         if row:
             return bool(row[0] == 1)
         return False
 
-async def log(action: str, data: str = ""):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "INSERT INTO logs(action,data,time) VALUES(?,?,?)",
-            (action, data, str(datetime.now()))
-        )
-        await db.commit()
-    logger.info(f"Лог: {action} - {data}")
+# Записи журнала складываются в очередь и пишутся в БД пачками фоновой задачей,
+# чтобы обработчики не ждали отдельного коммита на каждую строку
+LOG_QUEUE_SIZE = 10000
+log_queue: Optional[asyncio.Queue] = None
+log_writer_task: Optional[asyncio.Task] = None
+
+async def log_writer():
+    """Фоновая задача: забирает накопившиеся записи из log_queue и пишет их одной транзакцией"""
+    while True:
+        items = [await log_queue.get()]
+        while not log_queue.empty():
+            items.append(log_queue.get_nowait())
+        
+        # None в очереди означает остановку: дописываем то, что пришло до него
+        stop = None in items
+        rows = [item for item in items if item is not None]
+        if rows:
+            try:
+                async with transaction() as conn:
+                    await conn.executemany(SQL_INSERT_LOG, rows)
+            except Exception as e:
+                logger.error("Ошибка записи %s логов в БД: %s", len(rows), e)
+        if stop:
+            return
 
-async def is_banned(user_id: int) -> bool:
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("SELECT 1 FROM bans WHERE user_id=?", (user_id,))
-        return await cur.fetchone() is not None
+def start_log_writer():
+    global log_queue, log_writer_task
+    log_queue = asyncio.Queue(maxsize=LOG_QUEUE_SIZE)
+    log_writer_task = asyncio.create_task(log_writer())
 
-async def get_ban_info(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
-        try:
-            cur = await db.execute(
-                "SELECT reason, ban_time, admin_username FROM bans WHERE user_id=?",
-                (user_id,)
-            )
-            return await cur.fetchone()
-        except Exception as e:
-            logger.error(f"Ошибка получения информации о блокировке: {e}")
-            return None
+async def stop_log_writer():
+    """Дописывает оставшиеся записи журнала и останавливает фоновую задачу"""
+    if log_writer_task is None:
+        return
+    await log_queue.put(None)
+    await log_writer_task
+
+def log(action: str, data: str = ""):
+    try:
+        log_queue.put_nowait((action, data, now_str()))
+    except asyncio.QueueFull:
+        logger.warning("Очередь логов переполнена, запись не сохранена: %s - %s", action, data)
+    logger.info("Лог: %s - %s", action, data)
+
+# Кэш блокировок: user_id -> (reason, ban_time, admin_username).
+# Загружается в init_db() и обновляется в ban_user/unban_user после записи в БД.
+BANNED_USERS: Dict[int, Tuple[Optional[str], Optional[str], Optional[str]]] = {}
+
+async def load_bans_from_db():
+    """Загружает блокировки из БД в кэш BANNED_USERS"""
+    global BANNED_USERS
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall("SELECT user_id, reason, ban_time, admin_username FROM bans")
+    BANNED_USERS = {row[0]: tuple(row[1:]) for row in rows}
+    logger.info("Загружено %s блокировок из БД", len(BANNED_USERS))
+
+def is_banned(user_id: int) -> bool:
+    return user_id in BANNED_USERS
+
+def get_ban_info(user_id: int) -> Optional[tuple]:
+    """(reason, ban_time, admin_username) или None, если пользователь не заблокирован"""
+    return BANNED_USERS.get(user_id)
 
 async def ban_user(user_id: int, reason: str, admin: User):
-    async with aiosqlite.connect(DB_NAME) as db:
-        try:
-            await db.execute(
-                "INSERT OR REPLACE INTO bans(user_id, reason, ban_time, admin_id, admin_username) VALUES(?,?,?,?,?)",
-                (user_id, reason, str(datetime.now()), admin.id, admin.username or str(admin.id))
-            )
-        except Exception as e:
-            logger.error(f"Ошибка при блокировке пользователя: {e}")
-            await db.execute(
-                "INSERT OR REPLACE INTO bans(user_id, reason, ban_time) VALUES(?,?,?)",
-                (user_id, reason, str(datetime.now()))
-            )
-        await db.commit()
-    await log("ban", f"admin {admin.id} banned user {user_id}: {reason}")
+    ban_time = now_str()
+    admin_username = admin.username or str(admin.id)
+    async with writer() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO bans(user_id, reason, ban_time, admin_id, admin_username) VALUES(?,?,?,?,?)",
+            (user_id, reason, ban_time, admin.id, admin_username)
+        )
+    BANNED_USERS[user_id] = (reason, ban_time, admin_username)
+    SUBSCRIBED_USERS.pop(user_id, None)
+    log("ban", f"admin {admin.id} banned user {user_id}: {reason}")
 
 async def unban_user(user_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute("DELETE FROM bans WHERE user_id=?", (user_id,))
-        await db.commit()
-    await log("unban", f"user {user_id} unbanned")
+    async with writer() as conn:
+        await conn.execute("DELETE FROM bans WHERE user_id=?", (user_id,))
+    BANNED_USERS.pop(user_id, None)
+    log("unban", f"user {user_id} unbanned")
 
 async def get_banned_users(page: int = 1, per_page: int = 5):
     """Получить список заблокированных пользователей с пагинацией"""
     offset = (page - 1) * per_page
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("""
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall("""
             SELECT b.user_id, b.reason, b.ban_time, b.admin_username, u.username 
             FROM bans b 
             LEFT JOIN users u ON b.user_id = u.user_id 
             ORDER BY b.ban_time DESC
             LIMIT ? OFFSET ?
         """, (per_page, offset))
-        rows = await cur.fetchall()
-        
-        cur_count = await db.execute("SELECT COUNT(*) FROM bans")
-        total = (await cur_count.fetchone())[0]
-        
-        return rows, total
+    # BANNED_USERS зеркалирует таблицу bans, отдельный COUNT(*) не нужен
+    return rows, len(BANNED_USERS)
+
+# Ключевые слова черного списка и скомпилированный по ним автомат поиска.
+# Пересобираются только при добавлении/удалении слова, а не на каждый пост.
+BLACKLIST_KEYWORDS: set = set()
+BLACKLIST_MATCHER = None
+
+def rebuild_blacklist_matcher():
+    """Компилирует BLACKLIST_KEYWORDS в автомат Ахо-Корасик (или regex, если pyahocorasick не установлен)"""
+    global BLACKLIST_MATCHER
+    if not BLACKLIST_KEYWORDS:
+        BLACKLIST_MATCHER = None
+    elif ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for keyword in BLACKLIST_KEYWORDS:
+            automaton.add_word(keyword, keyword)
+        automaton.make_automaton()
+        BLACKLIST_MATCHER = automaton
+    else:
+        # Длинные слова первыми, чтобы при общем префиксе находилось более точное совпадение
+        keywords = sorted(BLACKLIST_KEYWORDS, key=len, reverse=True)
+        BLACKLIST_MATCHER = re.compile("|".join(map(re.escape, keywords)))
+
+async def load_blacklist_from_db():
+    """Загружает черный список публикаций из БД и компилирует автомат поиска"""
+    global BLACKLIST_KEYWORDS
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall("SELECT keyword FROM publication_blacklist")
+    BLACKLIST_KEYWORDS = {row[0] for row in rows}
+    rebuild_blacklist_matcher()
 
 async def add_to_publication_blacklist(keyword: str, admin_id: int):
     """Добавить ключевое слово в черный список для публикаций"""
     keyword_clean = keyword.strip().lower()
-    async with aiosqlite.connect(DB_NAME) as db:
-        try:
-            await db.execute(
+    try:
+        async with writer() as conn:
+            await conn.execute(
                 "INSERT INTO publication_blacklist(keyword, added_by, added_time) VALUES(?,?,?)",
-                (keyword_clean, admin_id, str(datetime.now()))
+                (keyword_clean, admin_id, now_str())
             )
-            await db.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
+        BLACKLIST_KEYWORDS.add(keyword_clean)
+        rebuild_blacklist_matcher()
+        return True
+    except aiosqlite.IntegrityError:
+        return False
 
 async def remove_from_publication_blacklist(keyword: str):
     """Удалить ключевое слово из черного списка"""
     keyword_clean = keyword.strip().lower()
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
+    async with writer() as conn:
+        await conn.execute(
             "DELETE FROM publication_blacklist WHERE keyword=?",
             (keyword_clean,)
         )
-        await db.commit()
-        return True
+    BLACKLIST_KEYWORDS.discard(keyword_clean)
+    rebuild_blacklist_matcher()
+    return True
 
 async def get_publication_blacklist(page: int = 1, per_page: int = 5):
     """Получить черный список с пагинацией"""
     offset = (page - 1) * per_page
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT keyword, added_by, added_time FROM publication_blacklist ORDER BY keyword LIMIT ? OFFSET ?",
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall(
+            """
+            SELECT pb.keyword, pb.added_by, pb.added_time, u.username
+            FROM publication_blacklist pb
+            LEFT JOIN users u ON pb.added_by = u.user_id
+            ORDER BY pb.keyword
+            LIMIT ? OFFSET ?
+            """,
             (per_page, offset)
         )
-        rows = await cur.fetchall()
-        
-        cur_count = await db.execute("SELECT COUNT(*) FROM publication_blacklist")
-        total = (await cur_count.fetchone())[0]
-        
-        return rows, total
+    return rows, len(BLACKLIST_KEYWORDS)
 
-async def is_in_publication_blacklist(text: str) -> tuple[bool, str]:
+def is_in_publication_blacklist(text: str) -> tuple[bool, str]:
     """Проверить, содержит ли текст слова из черного списка"""
+    if BLACKLIST_MATCHER is None:
+        return False, ""
+    
     text_lower = text.lower()
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("SELECT keyword FROM publication_blacklist")
-        rows = await cur.fetchall()
-        
-        for row in rows:
-            keyword = row[0]
-            if keyword in text_lower:
-                return True, keyword
+    if ahocorasick is not None:
+        for _, keyword in BLACKLIST_MATCHER.iter(text_lower):
+            return True, keyword
+    else:
+        match = BLACKLIST_MATCHER.search(text_lower)
+        if match:
+            return True, match.group(0)
     return False, ""
 
+# Число пользователей: считается один раз в init_db() и увеличивается в register_user(),
+# поэтому админ-панель и рассылка не делают COUNT(*) по всей таблице users
+USERS_COUNT = 0
+
+async def load_users_count_from_db():
+    global USERS_COUNT
+    USERS_COUNT = await get_users_count()
+
 async def register_user(user: User):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("SELECT 1 FROM users WHERE user_id=?", (user.id,))
-        if not await cur.fetchone():
-            await db.execute(
-                "INSERT INTO users(user_id, username, reg_date, is_subscribed) VALUES(?,?,?,?)",
-                (user.id, user.username, str(datetime.now().date()), 0)
-            )
-            await db.commit()
-            logger.info(f"Зарегистрирован новый пользователь: {user.id}")
-
-async def posts_today(user_id: int) -> int:
-    today = str(datetime.now().date())
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT COUNT(*) FROM posts WHERE user_id=? AND date(time)=?",
-            (user_id, today)
+    global USERS_COUNT
+    async with writer() as conn:
+        async with conn.execute(SQL_USER_EXISTS, (user.id,)) as cur:
+            exists = await cur.fetchone() is not None
+        if not exists:
+            await conn.execute(SQL_INSERT_USER, (user.id, user.username, date.today().isoformat(), 0))
+    if not exists:
+        USERS_COUNT += 1
+        logger.info("Зарегистрирован новый пользователь: %s", user.id)
+
+# Счётчик постов за текущий день: user_id -> количество. Загружается в init_db(),
+# увеличивается в create_post() и сбрасывается при смене даты.
+POSTS_TODAY: Dict[int, int] = {}
+POSTS_TODAY_DATE: Optional[date] = None
+
+def roll_posts_today():
+    """Сбрасывает POSTS_TODAY, если наступил новый день"""
+    global POSTS_TODAY_DATE
+    today = date.today()
+    if POSTS_TODAY_DATE != today:
+        POSTS_TODAY.clear()
+        POSTS_TODAY_DATE = today
+
+async def load_posts_today_from_db():
+    """Заполняет POSTS_TODAY по постам, созданным сегодня (чтобы лимит переживал перезапуск)"""
+    global POSTS_TODAY_DATE
+    # Границы дня вместо date(time), чтобы запрос использовал индекс idx_posts_user_time
+    today = date.today()
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall(
+            "SELECT user_id, COUNT(*) FROM posts WHERE time>=? AND time<? GROUP BY user_id",
+            day_bounds(today)
         )
-        row = await cur.fetchone()
-        return row[0] if row else 0
+    POSTS_TODAY.clear()
+    POSTS_TODAY.update(rows)
+    POSTS_TODAY_DATE = today
+
+def posts_today(user_id: int) -> int:
+    roll_posts_today()
+    return POSTS_TODAY.get(user_id, 0)
 
 async def posts_week(user_id: int) -> int:
-    week_ago = str(datetime.now() - timedelta(days=7))
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT COUNT(*) FROM posts WHERE user_id=? AND time>=?",
-            (user_id, week_ago)
-        )
-        row = await cur.fetchone()
+    week_ago = (datetime.now() - timedelta(days=7)).strftime(TIME_FORMAT)
+    async with db_readers.acquire() as conn:
+        async with conn.execute(SQL_POSTS_SINCE, (user_id, week_ago)) as cur:
+            row = await cur.fetchone()
         return row[0] if row else 0
 
 async def get_all_users():
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("SELECT user_id FROM users")
-        rows = await cur.fetchall()
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall("SELECT user_id FROM users")
         return [row[0] for row in rows]
 
 async def get_users_count():
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("SELECT COUNT(*) FROM users")
-        row = await cur.fetchone()
+    async with db_readers.acquire() as conn:
+        async with conn.execute("SELECT COUNT(*) FROM users") as cur:
+            row = await cur.fetchone()
         return row[0] if row else 0
 
-async def get_post_status(post_id: int) -> str:
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT status FROM posts WHERE id=?",
-            (post_id,)
+async def create_post(user_id: int, text: str, photo: Optional[str] = None,
+                      photo_unique_id: Optional[str] = None) -> int:
+    """Сохраняет новый пост со статусом moderation и возвращает его ID"""
+    async with writer() as conn:
+        cursor = await conn.execute(
+            SQL_INSERT_POST, (user_id, text, photo, photo_unique_id, 1 if photo else 0, now_str())
         )
-        row = await cur.fetchone()
+    roll_posts_today()
+    POSTS_TODAY[user_id] = POSTS_TODAY.get(user_id, 0) + 1
+    return cursor.lastrowid
+
+async def get_post_status(post_id: int) -> str:
+    async with db_readers.acquire() as conn:
+        async with conn.execute(SQL_GET_POST_STATUS, (post_id,)) as cur:
+            row = await cur.fetchone()
         return row[0] if row else ""
 
+async def claim_post_for_publish(post_id: int, moderator_id: int) -> Optional[tuple]:
+    """Отмечает пост опубликованным; (text, photo, user_id) или None, если пост уже обработан или не найден"""
+    async with writer() as conn:
+        async with conn.execute(SQL_CLAIM_PUBLISH, (moderator_id, now_ms(), post_id)) as cur:
+            return await cur.fetchone()
+
+async def release_post(post_id: int):
+    """Возвращает пост на модерацию, если отправка в канал после claim_post_for_publish не удалась"""
+    async with writer() as conn:
+        await conn.execute(SQL_RELEASE_POST, (post_id,))
+
+async def claim_post_for_reject(post_id: int, moderator_id: int, reason: str) -> Optional[int]:
+    """Отмечает пост отклонённым; ID автора или None, если пост уже обработан или не найден"""
+    async with writer() as conn:
+        async with conn.execute(SQL_CLAIM_REJECT, (moderator_id, now_ms(), reason, post_id)) as cur:
+            row = await cur.fetchone()
+    return row[0] if row else None
+
 async def get_post_moderator_info(post_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT moderator_id, reject_reason FROM posts WHERE id=?",
-            (post_id,)
-        )
-        row = await cur.fetchone()
-        if row:
-            moderator_id, reject_reason = row
-            if moderator_id:
-                cur2 = await db.execute(
-                    "SELECT username FROM users WHERE user_id=?",
-                    (moderator_id,)
-                )
-                mod_row = await cur2.fetchone()
-                mod_username = mod_row[0] if mod_row else None
-                return moderator_id, mod_username, reject_reason
-        return None, None, None
+    async with db_readers.acquire() as conn:
+        async with conn.execute("""
+            SELECT p.moderator_id, um.username, p.reject_reason
+            FROM posts p
+            LEFT JOIN users um ON p.moderator_id = um.user_id
+            WHERE p.id=?
+        """, (post_id,)) as cur:
+            row = await cur.fetchone()
+    if row and row[0]:
+        return row
+    return None, None, None
 
 async def update_post_message_ids(post_id: int, moderators_message_id: int = None, 
                                  admins_message_id: int = None):
-    async with aiosqlite.connect(DB_NAME) as db:
+    if not (moderators_message_id or admins_message_id):
+        return
+    async with writer() as conn:
         if moderators_message_id:
-            await db.execute(
-                "UPDATE posts SET message_id_moderators=?, chat_id_moderators=? WHERE id=?",
-                (moderators_message_id, MODERATORS_CHAT_ID, post_id)
-            )
+            await conn.execute(SQL_SET_MODERATORS_MESSAGE, (moderators_message_id, MODERATORS_CHAT_ID, post_id))
         if admins_message_id:
-            await db.execute(
-                "UPDATE posts SET message_id_admins=?, chat_id_admins=? WHERE id=?",
-                (admins_message_id, ADMINS_CHAT_ID, post_id)
-            )
-        await db.commit()
+            await conn.execute(SQL_SET_ADMINS_MESSAGE, (admins_message_id, ADMINS_CHAT_ID, post_id))
 
 async def update_admin_message_status(post_id: int, status: str, reason: str = None):
     try:
-        async with aiosqlite.connect(DB_NAME) as db:
-            cur = await db.execute("""
-                SELECT p.text, p.photo, p.message_id_admins, p.chat_id_admins, 
-                       p.user_id, u.username, p.moderator_id
-                FROM posts p 
-                LEFT JOIN users u ON p.user_id = u.user_id 
-                WHERE p.id=?
-            """, (post_id,))
-            row = await cur.fetchone()
-            
-            if not row or not row[2] or not row[3]:
-                return
-            
-            text, photo, message_id, chat_id, user_id, username, moderator_id = row
-            
-            mod_username = None
-            if moderator_id:
-                cur2 = await db.execute(
-                    "SELECT username FROM users WHERE user_id=?",
-                    (moderator_id,)
+        row = await db_readers.fetchone("""
+            SELECT p.text, p.has_photo, p.message_id_admins, p.chat_id_admins, 
+                   p.user_id, u.username, um.username
+            FROM posts p 
+            LEFT JOIN users u ON p.user_id = u.user_id 
+            LEFT JOIN users um ON p.moderator_id = um.user_id
+            WHERE p.id=?
+        """, (post_id,))
+        
+        if not row or not row[2] or not row[3]:
+            return
+        
+        text, has_photo, message_id, chat_id, user_id, username, mod_username = row
+        
+        if status == "published":
+            header = f"📨 Пост #{post_id} опубликован"
+            action_text = "👤 <b>Опубликовал:</b>"
+            button_text = "👤 Кто опубликовал"
+            callback_data = f"{CB_WHO_PUB}{post_id}"
+        elif status == "rejected":
+            header = f"📨 Пост #{post_id} отклонён"
+            action_text = "👤 <b>Отклонил:</b>"
+            button_text = "👤 Кто отклонил"
+            callback_data = f"{CB_WHO_REJ}{post_id}"
+        else:
+            return
+        
+        admin_text = (
+            f"{header}\n\n"
+            f"📄 <b>Текст:</b>\n{text}\n\n"
+            f"👤 <b>Автор:</b> @{username or 'без username'}\n"
+            f"🆔 <b>ID автора:</b> <code>{user_id}</code>\n"
+            f"{action_text} @{mod_username or 'неизвестно'}"
+        )
+        
+        if status == "rejected" and reason:
+            admin_text += f"\n📝 <b>Причина:</b> {reason}"
+        
+        kb = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=button_text, callback_data=callback_data)]
+        ])
+        
+        try:
+            if has_photo:
+                await bot.edit_message_caption(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    caption=admin_text,
+                    reply_markup=kb
                 )
-                mod_row = await cur2.fetchone()
-                mod_username = mod_row[0] if mod_row else None
-            
-            if status == "published":
-                header = f"📨 Пост #{post_id} опубликован"
-                action_text = "👤 <b>Опубликовал:</b>"
-                button_text = "👤 Кто опубликовал"
-                callback_data = f"who_pub_{post_id}"
-            elif status == "rejected":
-                header = f"📨 Пост #{post_id} отклонён"
-                action_text = "👤 <b>Отклонил:</b>"
-                button_text = "👤 Кто отклонил"
-                callback_data = f"who_rej_{post_id}"
             else:
-                return
-            
-            admin_text = (
-                f"{header}\n\n"
-                f"📄 <b>Текст:</b>\n{text}\n\n"
-                f"👤 <b>Автор:</b> @{username or 'без username'}\n"
-                f"🆔 <b>ID автора:</b> <code>{user_id}</code>\n"
-                f"{action_text} @{mod_username or 'неизвестно'}"
-            )
-            
-            if status == "rejected" and reason:
-                admin_text += f"\n📝 <b>Причина:</b> {reason}"
-            
-            kb = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text=button_text, callback_data=callback_data)]
-            ])
-            
-            try:
-                if photo:
-                    await bot.edit_message_caption(
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        caption=admin_text,
-                        parse_mode='HTML',
-                        reply_markup=kb
-                    )
-                else:
-                    await bot.edit_message_text(
-                        chat_id=chat_id,
-                        message_id=message_id,
-                        text=admin_text,
-                        parse_mode='HTML',
-                        reply_markup=kb
-                    )
-                logger.info(f"✅ Обновлено сообщение администраторов для поста #{post_id}")
-            except Exception as e:
-                logger.error(f"Ошибка при редактировании сообщения администраторов: {e}")
-            
+                await bot.edit_message_text(
+                    chat_id=chat_id,
+                    message_id=message_id,
+                    text=admin_text,
+                    reply_markup=kb
+                )
+            logger.info("✅ Обновлено сообщение администраторов для поста #%s", post_id)
+        except Exception as e:
+            logger.error("Ошибка при редактировании сообщения администраторов: %s", e)
+        
     except Exception as e:
-        logger.error(f"Ошибка обновления сообщения администраторов для поста #{post_id}: {e}")
+        logger.error("Ошибка обновления сообщения администраторов для поста #%s: %s", post_id, e)
 
 async def get_pending_posts(page: int = 1, per_page: int = 5):
     offset = (page - 1) * per_page
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT id, user_id, text, time, photo FROM posts WHERE status='moderation' ORDER BY id DESC LIMIT ? OFFSET ?",
+    async with db_readers.acquire() as conn:
+        rows = await conn.execute_fetchall(
+            "SELECT id, user_id, text, time, has_photo FROM posts WHERE status='moderation' ORDER BY id DESC LIMIT ? OFFSET ?",
             (per_page, offset)
         )
-        rows = await cur.fetchall()
         
-        cur_count = await db.execute("SELECT COUNT(*) FROM posts WHERE status='moderation'")
-        total = (await cur_count.fetchone())[0]
+        async with conn.execute("SELECT COUNT(*) FROM posts WHERE status='moderation'") as cur_count:
+            total = (await cur_count.fetchone())[0]
         
         return rows, total
 
 async def get_post_by_id(post_id: int):
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
+    async with db_readers.acquire() as conn:
+        async with conn.execute(
             "SELECT id, user_id, text, photo, time, status FROM posts WHERE id=?",
             (post_id,)
-        )
-        return await cur.fetchone()
+        ) as cur:
+            return await cur.fetchone()
 
 # ================== VALIDATION ==================
+# Обязательные эмодзи в тексте поста
+EMOJI_RE = re.compile("[🧑👩]")
+
 def validate_post_text(text: str) -> tuple[bool, str]:
-    if not text or text.strip() == "":
+    stripped_len = len(text.strip()) if text else 0
+    if stripped_len == 0:
         return False, "❌ Текст поста не может быть пустым."
     
-    if len(text.strip()) < 5:
+    if stripped_len < 5:
         return False, "❌ Текст поста слишком короткий"
     
     if len(text) > 100:
         return False, "❌ Текст поста слишком длинный (максимум 100 символов)."
     
-    if "🧑" not in text and "👩" not in text:
+    if not EMOJI_RE.search(text):
         return False, (
             "❌ <b>Обязательно добавьте один из этих эмодзи:</b>\n"
             "• 🧑 (мужчина)\n"
@@ -651,76 +1063,131 @@ def validate_post_text(text: str) -> tuple[bool, str]:
     return True, "✅ Текст прошел проверку."
 
 # ================== KEYBOARDS ==================
+# Префиксы callback_data с параметром: общие для клавиатур, фильтров и разбора
+CB_REMOVE_SUB = "remove_sub_"
+CB_WHO_PUB = "who_pub_"
+CB_WHO_REJ = "who_rej_"
+CB_PUB = "pub_"
+CB_YES = "yes_"
+CB_NO = "no_"
+CB_REJ = "rej_"
+CB_CANCEL_REJ = "cancel_rej_"
+CB_BANNED_PAGE = "banned_page_"
+CB_PUBBLACK_PAGE = "pubblack_page_"
+CB_REMOVE_BLACKLIST_WORD = "remove_blacklist_word_"
+CB_PENDING_PAGE = "pending_page_"
+CB_LOGS_OLDER = "logs_older_"
+CB_LOGS_NEWER = "logs_newer_"
+CB_ADMIN_PUBLISH_CONFIRM = "admin_publish_confirm_"
+CB_ADMIN_REJECT_CONFIRM = "admin_reject_confirm_"
+CB_ADMIN_REJECT_SEND = "admin_reject_send_"
+
+# callback_data кнопок админ-панели: не-админам на них отвечаем отказом, остальное не трогаем
+ADMIN_CALLBACKS = frozenset({
+    "manage_subscriptions", "list_subscriptions", "add_channel_subscription", "add_group_subscription",
+    "remove_subscription", "refresh_subscriptions", "admin_panel", "blacklist", "banned_users",
+    "pub_blacklist", "add_pub_blacklist", "remove_pub_blacklist", "admin_stats", "admin_logs",
+    "pending_posts", "admin_publish_post", "admin_publish_cancel", "admin_reject_post",
+    "admin_reject_cancel", "broadcast", "broadcast_text", "broadcast_photo", "broadcast_start",
+    "broadcast_cancel",
+})
+ADMIN_CALLBACK_PREFIXES = (
+    CB_REMOVE_SUB, CB_BANNED_PAGE, CB_PUBBLACK_PAGE, CB_REMOVE_BLACKLIST_WORD, CB_LOGS_OLDER,
+    CB_LOGS_NEWER, CB_PENDING_PAGE, CB_ADMIN_PUBLISH_CONFIRM, CB_ADMIN_REJECT_CONFIRM, CB_ADMIN_REJECT_SEND,
+)
+
+# Неизменяемые клавиатуры собираются один раз при импорте; функции возвращают готовый объект
+MAIN_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📩 Предложить пост", callback_data="offer")],
+    [
+        InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq"),
+        InlineKeyboardButton(text="📜 Правила", callback_data="rules")
+    ],
+    [InlineKeyboardButton(text="👤 Профиль", callback_data="profile")],
+    [
+        InlineKeyboardButton(text="🔒 VPN", url="https://t.me/hitvpnbot?start=176967621463581"),
+        InlineKeyboardButton(text="🛒 Магазин звёзд", url="https://t.me/smotrmaslyaninostars_bot")
+    ],
+    [InlineKeyboardButton(text="📢 Реклама", callback_data="ads")]
+])
+
 def main_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📩 Предложить пост", callback_data="offer")],
-        [
-            InlineKeyboardButton(text="❓ Частые вопросы", callback_data="faq"),
-            InlineKeyboardButton(text="📜 Правила", callback_data="rules")
-        ],
-        [InlineKeyboardButton(text="👤 Профиль", callback_data="profile")],
-        [
-            InlineKeyboardButton(text="🔒 VPN", url="https://t.me/hitvpnbot?start=176967621463581"),
-            InlineKeyboardButton(text="🛒 Магазин звёзд", url="https://t.me/smotrmaslyaninostars_bot")
-        ],
-        [InlineKeyboardButton(text="📢 Реклама", callback_data="ads")]
-    ])
+    return MAIN_MENU_KB
+
+MENU_BTN_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="menu")]
+])
 
 def menu_btn():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="menu")]
-    ])
+    return MENU_BTN_KB
+
+RULES_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⚖️ Юридическое уведомление", url="https://teletype.in/@smotrmaslyanino/responsibility")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu")]
+])
 
 def rules_keyboard():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⚖️ Юридическое уведомление", url="https://teletype.in/@smotrmaslyanino/responsibility")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu")]
-    ])
+    return RULES_KB
+
+BACK_TO_POST_TYPE_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="↩️ К выбору типа поста", callback_data="offer")]
+])
 
 def back_to_post_type():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="↩️ К выбору типа поста", callback_data="offer")]
-    ])
+    return BACK_TO_POST_TYPE_KB
+
+FAQ_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="🗑️ Удалить запись", url="https://t.me/nekon4il")],
+    [InlineKeyboardButton(text="👥 Администрация", callback_data="admins")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu")]
+])
 
 def faq_keyboard():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🗑️ Удалить запись", url="https://t.me/nekon4il")],
-        [InlineKeyboardButton(text="👥 Администрация", callback_data="admins")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu")]
-    ])
+    return FAQ_KB
+
+ADMINS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="faq")],
+    [InlineKeyboardButton(text="🏠 Главное меню", callback_data="menu")]
+])
 
 def admins_keyboard():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="faq")],
-        [InlineKeyboardButton(text="🏠 Главное меню", callback_data="menu")]
-    ])
+    return ADMINS_KB
+
+ADMIN_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
+    [InlineKeyboardButton(text="📨 Посты на модерации", callback_data="pending_posts")],
+    [InlineKeyboardButton(text="🚫 Черный список", callback_data="blacklist")],
+    [InlineKeyboardButton(text="📢 Рассылка", callback_data="broadcast")],
+    [InlineKeyboardButton(text="📋 Логи", callback_data="admin_logs")],
+    [InlineKeyboardButton(text="💳 Управление подписками", callback_data="manage_subscriptions")]
+])
 
 def admin_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats")],
-        [InlineKeyboardButton(text="📨 Посты на модерации", callback_data="pending_posts")],
-        [InlineKeyboardButton(text="🚫 Черный список", callback_data="blacklist")],
-        [InlineKeyboardButton(text="📢 Рассылка", callback_data="broadcast")],
-        [InlineKeyboardButton(text="📋 Логи", callback_data="admin_logs")],
-        [InlineKeyboardButton(text="💳 Управление подписками", callback_data="manage_subscriptions")]
-    ])
+    return ADMIN_MENU_KB
+
+BLACKLIST_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="👤 Заблокированные пользователи", callback_data="banned_users")],
+    [InlineKeyboardButton(text="📝 Черный список публикаций", callback_data="pub_blacklist")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
+])
 
 def blacklist_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="👤 Заблокированные пользователи", callback_data="banned_users")],
-        [InlineKeyboardButton(text="📝 Черный список публикаций", callback_data="pub_blacklist")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
-    ])
+    return BLACKLIST_MENU_KB
+
+# Клавиатуры страниц списков зависят только от номера страницы и их числа,
+# поэтому, как и статичные меню выше, собираются один раз и переиспользуются
+PAGINATION_KB_CACHE_SIZE = 256
 
+@functools.lru_cache(maxsize=PAGINATION_KB_CACHE_SIZE)
 def pub_blacklist_menu(current_page: int = 1, total_pages: int = 1):
     """Клавиатура для черного списка публикаций с кнопками управления"""
     keyboard = []
     
     nav_buttons = []
     if current_page > 1:
-        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"pubblack_page_{current_page - 1}"))
+        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"{CB_PUBBLACK_PAGE}{current_page - 1}"))
     if current_page < total_pages:
-        nav_buttons.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"pubblack_page_{current_page + 1}"))
+        nav_buttons.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"{CB_PUBBLACK_PAGE}{current_page + 1}"))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -734,76 +1201,124 @@ def pub_blacklist_menu(current_page: int = 1, total_pages: int = 1):
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+BLACKLIST_CANCEL_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="pub_blacklist")]
+])
+
 def blacklist_cancel_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="pub_blacklist")]
-    ])
+    return BLACKLIST_CANCEL_MENU_KB
+
+BROADCAST_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📝 Текстовая рассылка", callback_data="broadcast_text")],
+    [InlineKeyboardButton(text="📷 Рассылка с фото", callback_data="broadcast_photo")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
+])
 
 def broadcast_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📝 Текстовая рассылка", callback_data="broadcast_text")],
-        [InlineKeyboardButton(text="📷 Рассылка с фото", callback_data="broadcast_photo")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
-    ])
+    return BROADCAST_MENU_KB
+
+BROADCAST_CONFIRM_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [
+        InlineKeyboardButton(text="✅ Начать рассылку", callback_data="broadcast_start"),
+        InlineKeyboardButton(text="❌ Отмена", callback_data="broadcast_cancel")
+    ]
+])
 
 def broadcast_confirm_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [
-            InlineKeyboardButton(text="✅ Начать рассылку", callback_data="broadcast_start"),
-            InlineKeyboardButton(text="❌ Отмена", callback_data="broadcast_cancel")
-        ]
-    ])
+    return BROADCAST_CONFIRM_MENU_KB
+
+BROADCAST_CANCEL_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="❌ Отменить", callback_data="broadcast_cancel")]
+])
 
 def broadcast_cancel_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Отменить", callback_data="broadcast_cancel")]
-    ])
+    return BROADCAST_CANCEL_MENU_KB
+
+SUBSCRIPTIONS_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📋 Список подписок", callback_data="list_subscriptions")],
+    [InlineKeyboardButton(text="➕ Добавить канал", callback_data="add_channel_subscription")],
+    [InlineKeyboardButton(text="👥 Добавить группу", callback_data="add_group_subscription")],
+    [InlineKeyboardButton(text="🗑️ Удалить подписку", callback_data="remove_subscription")],
+    [InlineKeyboardButton(text="🔄 Обновить подписки", callback_data="refresh_subscriptions")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
+])
 
 def subscriptions_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📋 Список подписок", callback_data="list_subscriptions")],
-        [InlineKeyboardButton(text="➕ Добавить канал", callback_data="add_channel_subscription")],
-        [InlineKeyboardButton(text="👥 Добавить группу", callback_data="add_group_subscription")],
-        [InlineKeyboardButton(text="🗑️ Удалить подписку", callback_data="remove_subscription")],
-        [InlineKeyboardButton(text="🔄 Обновить подписки", callback_data="refresh_subscriptions")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_panel")]
-    ])
+    return SUBSCRIPTIONS_MENU_KB
+
+SUBSCRIPTION_CANCEL_MENU_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="❌ Отмена", callback_data="manage_subscriptions")]
+])
 
 def subscription_cancel_menu():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Отмена", callback_data="manage_subscriptions")]
-    ])
+    return SUBSCRIPTION_CANCEL_MENU_KB
+
+ADS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="💰 Прайс-лист", url="https://t.me/smotrmaslyanino_price")],
+    [InlineKeyboardButton(text="🛒 Купить", url="https://t.me/theaugustine")],
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu")]
+])
 
 def ads_keyboard():
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="💰 Прайс-лист", url="https://t.me/smotrmaslyanino_price")],
-        [InlineKeyboardButton(text="🛒 Купить", url="https://t.me/theaugustine")],
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="menu")]
-    ])
+    return ADS_KB
 
+# Клавиатуры модерации зависят только от ID поста; разметку aiogram не меняет, поэтому её можно
+# переиспользовать между отправкой, сбросом отказа и повторными нажатиями
+MODERATION_KB_CACHE_SIZE = 1024
+
+@functools.lru_cache(maxsize=MODERATION_KB_CACHE_SIZE)
 def moderation_keyboard(post_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Опубликовать", callback_data=f"pub_{post_id}"),
-            InlineKeyboardButton(text="❌ Отказать", callback_data=f"rej_{post_id}")
+            InlineKeyboardButton(text="✅ Опубликовать", callback_data=f"{CB_PUB}{post_id}"),
+            InlineKeyboardButton(text="❌ Отказать", callback_data=f"{CB_REJ}{post_id}")
         ]
     ])
 
-def disabled_moderation_keyboard(post_id: int, action: str = "published") -> InlineKeyboardMarkup:
-    if action == "published":
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="✅ Опубликовано", callback_data="disabled")]
-        ])
-    else:
-        return InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отклонено", callback_data="disabled")]
-        ])
+@functools.lru_cache(maxsize=MODERATION_KB_CACHE_SIZE)
+def publish_confirm_keyboard(post_id: int) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Да, опубликовать", callback_data=f"{CB_YES}{post_id}")],
+        [InlineKeyboardButton(text="❌ Нет, отменить", callback_data=f"{CB_NO}{post_id}")]
+    ])
 
-def back_to_previous():
+@functools.lru_cache(maxsize=MODERATION_KB_CACHE_SIZE)
+def cancel_reject_keyboard(post_id: int) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_previous_step")]
+        [InlineKeyboardButton(text="❌ Отмена", callback_data=f"{CB_CANCEL_REJ}{post_id}")]
     ])
 
+PUBLISHED_MODERATION_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="✅ Опубликовано", callback_data="disabled")]
+])
+
+REJECTED_MODERATION_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="❌ Отклонено", callback_data="disabled")]
+])
+
+DISABLED_MODERATION_KB = {
+    "published": PUBLISHED_MODERATION_KB,
+    "rejected": REJECTED_MODERATION_KB,
+}
+
+def disabled_moderation_keyboard(post_id: int, action: str = "published") -> InlineKeyboardMarkup:
+    # Любое действие, кроме публикации, показывается как отклонение
+    return DISABLED_MODERATION_KB.get(action, REJECTED_MODERATION_KB)
+
+BACK_TO_PREVIOUS_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_previous_step")]
+])
+
+POST_TYPE_KB = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="📷 С фото", callback_data="with_photo")],
+    [InlineKeyboardButton(text="📝 Без фото", callback_data="no_photo")],
+    [InlineKeyboardButton(text="⬅ Назад", callback_data="menu")]
+])
+
+def back_to_previous():
+    return BACK_TO_PREVIOUS_KB
+
+@functools.lru_cache(maxsize=PAGINATION_KB_CACHE_SIZE)
 def pagination_keyboard(current_page: int, total_pages: int, list_type: str, back_callback: str = "blacklist"):
     keyboard = []
     
@@ -820,14 +1335,28 @@ def pagination_keyboard(current_page: int, total_pages: int, list_type: str, bac
     
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
+def logs_keyboard(page: int, newest_id: int, oldest_id: int, has_newer: bool, has_older: bool):
+    """Навигация по логам: в кнопках ID крайних записей страницы (keyset-пагинация)"""
+    nav_buttons = []
+    if has_newer:
+        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"{CB_LOGS_NEWER}{page - 1}_{newest_id}"))
+    if has_older:
+        nav_buttons.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"{CB_LOGS_OLDER}{page + 1}_{oldest_id}"))
+    
+    keyboard = [nav_buttons] if nav_buttons else []
+    keyboard.append([InlineKeyboardButton(text="⬅️ В меню", callback_data="admin_panel")])
+    
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+@functools.lru_cache(maxsize=PAGINATION_KB_CACHE_SIZE)
 def pending_posts_keyboard(current_page: int, total_pages: int):
     keyboard = []
     
     nav_buttons = []
     if current_page > 1:
-        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"pending_page_{current_page - 1}"))
+        nav_buttons.append(InlineKeyboardButton(text="◀️ Назад", callback_data=f"{CB_PENDING_PAGE}{current_page - 1}"))
     if current_page < total_pages:
-        nav_buttons.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"pending_page_{current_page + 1}"))
+        nav_buttons.append(InlineKeyboardButton(text="Далее ▶️", callback_data=f"{CB_PENDING_PAGE}{current_page + 1}"))
     
     if nav_buttons:
         keyboard.append(nav_buttons)
@@ -852,95 +1381,63 @@ def admin_post_confirm_keyboard(post_id: int, action: str):
 def admin_reject_reason_confirm_keyboard(post_id: int):
     return InlineKeyboardMarkup(inline_keyboard=[
         [
-            InlineKeyboardButton(text="✅ Отправить", callback_data=f"admin_reject_send_{post_id}"),
+            InlineKeyboardButton(text="✅ Отправить", callback_data=f"{CB_ADMIN_REJECT_SEND}{post_id}"),
             InlineKeyboardButton(text="❌ Отмена", callback_data="admin_reject_cancel")
         ]
     ])
 
 # ================== MIDDLEWARE ==================
-class ChatValidationMiddleware:
+class CombinedMiddleware:
+    """Проверка чата и подписки за один проход middleware.
+
+    События из групп проходят только проверку чата/темы, события из личных
+    сообщений — проверку блокировки и подписки (админы пропускаются сразу).
+    """
+
     async def __call__(self, handler, event, data):
-        if isinstance(event, CallbackQuery):
-            if event.message.chat.type == 'private' and event.from_user.id in ADMINS:
-                admin_commands = [
-                    'blacklist', 'banned_users', 'pub_blacklist', 
-                    'add_pub_blacklist', 'remove_pub_blacklist',
-                    'banned_page_', 'pubblack_page_', 'admin_stats', 
-                    'pending_posts', 'pending_page_', 'admin_panel',
-                    'broadcast', 'manage_subscriptions', 'list_subscriptions',
-                    'add_channel_subscription', 'add_group_subscription',
-                    'remove_subscription', 
-                    'refresh_subscriptions', 'admin_publish_post', 
-                    'admin_reject_post'
-                ]
-                
-                for cmd in admin_commands:
-                    if event.data.startswith(cmd):
-                        return await handler(event, data)
-        
-        if isinstance(event, Message):
-            if event.chat.type in ['group', 'supergroup']:
-                if event.chat.id in [MODERATORS_CHAT_ID, ADMINS_CHAT_ID]:
-                    if event.chat.id == MODERATORS_CHAT_ID and not is_valid_moderators_chat(event):
-                        logger.warning(f"Сообщение из неправильной темы группы модераторов: {event.message_thread_id}")
-                        return
-                    elif event.chat.id == ADMINS_CHAT_ID and not is_valid_admins_chat(event):
-                        logger.warning(f"Сообщение из неправильной темы группы администраторов: {event.message_thread_id}")
-                        return
-                else:
-                    return
+        is_message = isinstance(event, Message)
+        chat = event.chat if is_message else event.message.chat
         
-        elif isinstance(event, CallbackQuery):
-            if event.message.chat.type in ['group', 'supergroup']:
-                if event.message.chat.id == MODERATORS_CHAT_ID:
-                    if not await validate_chat_for_moderation(event):
-                        await event.answer("⚠️ Это действие доступно только в теме модерации", show_alert=True)
-                        return
-                elif event.message.chat.id == ADMINS_CHAT_ID:
-                    if not await validate_chat_for_admin_actions(event):
-                        await event.answer("⚠️ Это действие доступно только в теме администраторов", show_alert=True)
-                        return
-                else:
+        if chat.type in GROUP_CHAT_TYPES:
+            # Посторонние группы отсекаем сразу, до проверки тем
+            if chat.id not in STAFF_CHAT_IDS:
+                if not is_message:
                     await event.answer("⚠️ Это действие недоступно в этой группе", show_alert=True)
+                return
+            if is_message:
+                if not self.is_allowed_group_message(event):
                     return
-        
-        return await handler(event, data)
-
-class SubscriptionMiddleware:
-    async def __call__(self, handler, event, data):
-        # Админы всегда могут использовать бота
-        if hasattr(event, 'from_user') and event.from_user.id in ADMINS:
+            elif not await self.is_allowed_group_callback(event):
+                return
             return await handler(event, data)
         
-        # Пропускаем сообщения из групп
-        if isinstance(event, Message) and event.chat.type in ['group', 'supergroup']:
-            return await handler(event, data)
+        user_id = event.from_user.id
         
-        # Пропускаем callback из групп
-        if isinstance(event, CallbackQuery) and event.message.chat.type in ['group', 'supergroup']:
+        # Админы всегда могут использовать бота
+        if user_id in ADMINS_SET:
             return await handler(event, data)
         
-        user_id = event.from_user.id
-        
         # Проверка на блокировку
-        if await is_banned(user_id):
-            if isinstance(event, CallbackQuery):
-                await event.answer("🚫 Вы заблокированы.", show_alert=True)
-            elif isinstance(event, Message):
+        if is_banned(user_id):
+            if is_message:
                 await event.answer("🚫 Вы заблокированы.")
+            else:
+                await event.answer("🚫 Вы заблокированы.", show_alert=True)
             return
         
         # Обработка команды /start и проверки подписки
-        if isinstance(event, Message):
+        if is_message:
             if event.text and event.text == "/start":
                 return await handler(event, data)
+        elif event.data == "check_subscription":
+            return await handler(event, data)
         
-        if isinstance(event, CallbackQuery):
-            if event.data == "check_subscription":
-                return await handler(event, data)
+        # Подписка подтверждена недавно — не дёргаем Telegram API повторно
+        if is_subscription_cached(user_id):
+            return await handler(event, data)
         
         # Проверка подписки
-        is_subscribed, unsubscribed = await check_subscription(user_id)
+        _, unsubscribed = await check_subscription(user_id)
         
         # Фильтруем только каналы и группы (ботов пропускаем)
         unsubscribed_required = [sub for sub in unsubscribed if sub["type"] in ["channel", "group"]]
@@ -951,61 +1448,85 @@ class SubscriptionMiddleware:
                 f"👇 <i>Нажмите на кнопки ниже, чтобы перейти и подписаться, затем нажмите «Я подписался»:</i>"
             )
             
-            if isinstance(event, CallbackQuery):
-                await event.answer("⚠️ Вы не подписаны на обязательные ресурсы.", show_alert=True)
-                await event.message.edit_text(text, parse_mode='HTML', reply_markup=get_subscription_keyboard(unsubscribed_required))
+            if is_message:
+                await event.answer(text, reply_markup=get_subscription_keyboard(unsubscribed_required))
             else:
-                await event.answer(text, parse_mode='HTML', reply_markup=get_subscription_keyboard(unsubscribed_required))
+                await event.answer("⚠️ Вы не подписаны на обязательные ресурсы.", show_alert=True)
+                await event.message.edit_text(text, reply_markup=get_subscription_keyboard(unsubscribed_required))
             return
         
-        # Если подписка есть, обновляем статус в БД
-        if not is_subscribed:
+        # Подписка подтверждена впервые с запуска (или после смены списка) — сохраняем статус в БД;
+        # при повторной проверке по истечении TTL достаточно обновить отметку в памяти
+        if user_id not in SUBSCRIBED_USERS:
             await update_user_subscription_status(user_id, True)
+        else:
+            SUBSCRIBED_USERS[user_id] = time.monotonic()
         
         return await handler(event, data)
 
-chat_validation_middleware = ChatValidationMiddleware()
-subscription_middleware = SubscriptionMiddleware()
+    @staticmethod
+    def is_allowed_group_message(event: Message) -> bool:
+        """Сообщения принимаются только из нужных тем групп модераторов и администраторов"""
+        if event.chat.id == MODERATORS_CHAT_ID:
+            if not is_valid_moderators_chat(event):
+                logger.warning("Сообщение из неправильной темы группы модераторов: %s", event.message_thread_id)
+                return False
+            return True
+        if not is_valid_admins_chat(event):
+            logger.warning("Сообщение из неправильной темы группы администраторов: %s", event.message_thread_id)
+            return False
+        return True
+
+    @staticmethod
+    async def is_allowed_group_callback(event: CallbackQuery) -> bool:
+        if event.message.chat.id == MODERATORS_CHAT_ID:
+            if not validate_chat_for_moderation(event):
+                await event.answer("⚠️ Это действие доступно только в теме модерации", show_alert=True)
+                return False
+            return True
+        if not validate_chat_for_admin_actions(event):
+            await event.answer("⚠️ Это действие доступно только в теме администраторов", show_alert=True)
+            return False
+        return True
 
-dp.message.middleware(chat_validation_middleware)
-dp.message.middleware(subscription_middleware)
-dp.callback_query.middleware(chat_validation_middleware)
-dp.callback_query.middleware(subscription_middleware)
+combined_middleware = CombinedMiddleware()
+
+dp.message.middleware(combined_middleware)
+dp.callback_query.middleware(combined_middleware)
 
 # ================== START ==================
-@dp.message(F.text == "/start")
+# Тип чата проверяется фильтром: /start из групп персонала (после проверки темы в middleware)
+# сюда не попадает и обрабатывается в start_not_private
+@dp.message(F.text == "/start", F.chat.type == "private")
 async def start(msg: Message):
-    if msg.chat.type not in ['private']:
-        return await msg.answer("⚠️ Бот работает только в личных сообщениях")
-    
-    if await is_banned(msg.from_user.id):
-        ban_info = await get_ban_info(msg.from_user.id)
-        if ban_info:
-            reason, ban_time, admin_username = ban_info
-            return await msg.answer(
-                f"🚫 Вы заблокированы.\n\n"
-                f"📝 Причина: {reason}\n"
-                f"🕐 Время блокировки: {ban_time}\n"
-                f"👮 Вас заблокировал администратор: @{admin_username or 'неизвестно'}"
-            )
-        return await msg.answer("🚫 Вы заблокированы.")
+    user_id = msg.from_user.id
+    # Одна выборка из BANNED_USERS: None — пользователь не заблокирован
+    ban_info = get_ban_info(user_id)
+    if ban_info:
+        reason, ban_time, admin_username = ban_info
+        return await msg.answer(
+            f"🚫 Вы заблокированы.\n\n"
+            f"📝 Причина: {reason}\n"
+            f"🕐 Время блокировки: {ban_time}\n"
+            f"👮 Вас заблокировал администратор: @{admin_username or 'неизвестно'}",
+            parse_mode=None
+        )
     
     await register_user(msg.from_user)
     
     # Проверяем подписку при старте
-    is_subscribed, unsubscribed = await check_subscription(msg.from_user.id)
+    is_subscribed, unsubscribed = await check_subscription(user_id)
     unsubscribed_required = [sub for sub in unsubscribed if sub["type"] in ["channel", "group"]]
     
     if unsubscribed_required:
         await msg.answer(
             f"<b>Для начала вам нужно подписаться</b>\n"
             f"После этого нажмите на кнопку «Я подписался».\n",
-            parse_mode='HTML',
             reply_markup=get_subscription_keyboard(unsubscribed_required)
         )
         return
     
-    await update_user_subscription_status(msg.from_user.id, True)
+    await update_user_subscription_status(user_id, True)
     
     await msg.answer(
         "Привет! 👋\n"
@@ -1013,18 +1534,26 @@ async def start(msg: Message):
         "⚠️ <b>Важное правило:</b>\n"
         "Каждый пост должен содержать эмодзи 🧑 или 👩\n\n"
         "Выбери действие:",
-        parse_mode='HTML',
         reply_markup=main_menu()
     )
 
-@dp.callback_query(F.data == "check_subscription")
+# Пользователи, для которых сейчас выполняется проверка по кнопке «Я подписался»
+CHECKING_SUBSCRIPTION_USERS: set = set()
+
+@dp.callback_query(F.data == "check_subscription", F.message.chat.type == "private")
 async def check_subscription_callback(cb: CallbackQuery):
-    if cb.message.chat.type not in ['private']:
-        return await cb.answer("⚠️ Действие доступно только в личных сообщениях", show_alert=True)
+    user_id = cb.from_user.id
+    # Повторные нажатия, пока идёт проверка, не запускают новые запросы к Telegram
+    if user_id in CHECKING_SUBSCRIPTION_USERS:
+        return await cb.answer("⏳ Проверка уже выполняется...")
     
     await cb.answer("⏳ Проверяем подписку...")
     
-    is_subscribed, unsubscribed = await check_subscription(cb.from_user.id)
+    CHECKING_SUBSCRIPTION_USERS.add(user_id)
+    try:
+        is_subscribed, unsubscribed = await check_subscription(user_id, use_cache=False)
+    finally:
+        CHECKING_SUBSCRIPTION_USERS.discard(user_id)
     
     unsubscribed_required = [sub for sub in unsubscribed if sub["type"] in ["channel", "group"]]
     
@@ -1032,12 +1561,11 @@ async def check_subscription_callback(cb: CallbackQuery):
         await cb.message.edit_text(
             f"<b>Вы еще не подписались 😡</b>\n"
             f"После подписки нажмите кнопку «Я подписался» еще раз",
-            parse_mode='HTML',
             reply_markup=get_subscription_keyboard(unsubscribed_required)
         )
         return
     
-    await update_user_subscription_status(cb.from_user.id, True)
+    await update_user_subscription_status(user_id, True)
     
     await cb.message.edit_text(
         "✅ <b>Отлично! Вы подписались на необходимые ресурсы</b>\n\n"
@@ -1046,60 +1574,59 @@ async def check_subscription_callback(cb: CallbackQuery):
         "⚠️ <b>Важное правило:</b>\n"
         "Каждый пост должен содержать эмодзи 🧑 или 👩!\n\n"
         "Выбери действие:",
-        parse_mode='HTML',
         reply_markup=main_menu()
     )
 
+@dp.message(F.text == "/start")
+async def start_not_private(msg: Message):
+    await msg.answer("⚠️ Бот работает только в личных сообщениях")
+
+@dp.callback_query(F.data == "check_subscription")
+async def check_subscription_not_private(cb: CallbackQuery):
+    await cb.answer("⚠️ Действие доступно только в личных сообщениях", show_alert=True)
+
 # ================== УПРАВЛЕНИЕ ПОДПИСКАМИ ==================
-@dp.callback_query(F.data == "manage_subscriptions")
+@admin_router.callback_query(F.data == "manage_subscriptions")
 async def manage_subscriptions(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await cb.message.edit_text(
         "📢 <b>Управление обязательными подписками</b>\n\n"
         f"📊 <b>Текущее количество подписок:</b> {len(REQUIRED_SUBSCRIPTIONS)}\n\n"
         "<i>Выберите действие:</i>",
-        parse_mode='HTML',
         reply_markup=subscriptions_menu()
     )
 
-@dp.callback_query(F.data == "list_subscriptions")
+SUBSCRIPTION_ENTRY_FMT = (
+    "{i}. {emoji} <b>{name}</b>\n"
+    "   Тип: {type}\n"
+    "   ID/Username: <code>{id}</code>\n"
+    "   Юзернейм: {username}\n"
+    "   Ссылка: {url}\n"
+)
+
+@admin_router.callback_query(F.data == "list_subscriptions")
 async def list_subscriptions(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     if not REQUIRED_SUBSCRIPTIONS:
         text = "📋 <b>Список обязательных подписок пуст</b>"
     else:
-        text_lines = ["📋 <b>Обязательные подписки:</b>\n\n"]
+        header = "📋 <b>Обязательные подписки:</b>\n\n"
+        entries = []
+        length = len(header)
         
+        # Останавливаемся у лимита сообщения, а не собираем весь список и обрезаем
         for i, sub in enumerate(REQUIRED_SUBSCRIPTIONS, 1):
-            if sub["type"] == "channel":
-                emoji = "📢"
-            elif sub["type"] == "group":
-                emoji = "👥"
-            else:
-                emoji = "🤖"
-                
-            text_lines.append(f"{i}. {emoji} <b>{sub['name']}</b>")
-            text_lines.append(f"   Тип: {sub['type']}")
-            text_lines.append(f"   ID/Username: <code>{sub['id']}</code>")
-            text_lines.append(f"   Юзернейм: {sub['username']}")
-            text_lines.append(f"   Ссылка: {sub['url']}\n")
-        
-        text = "\n".join(text_lines)
+            entry = SUBSCRIPTION_ENTRY_FMT.format(i=i, **sub)
+            length += len(entry) + 1
+            if length > 4000:
+                entries.append("\n... (список слишком длинный)")
+                break
+            entries.append(entry)
         
-        if len(text) > 4000:
-            text = text[:4000] + "\n\n... (список слишком длинный)"
+        text = header + "\n" + "\n".join(entries)
     
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=subscriptions_menu())
+    await cb.message.edit_text(text, reply_markup=subscriptions_menu())
 
-@dp.callback_query(F.data == "add_channel_subscription")
+@admin_router.callback_query(F.data == "add_channel_subscription")
 async def add_channel_subscription(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(SubscriptionState.wait_subscription_add)
     await state.update_data(sub_type="channel")
     
@@ -1113,15 +1640,11 @@ async def add_channel_subscription(cb: CallbackQuery, state: FSMContext):
         "1. ID канала должен быть числом (начинаться с -100)\n"
         "2. Юзернейм должен начинаться с @\n"
         "3. Название может содержать пробелы",
-        parse_mode='HTML',
         reply_markup=subscription_cancel_menu()
     )
 
-@dp.callback_query(F.data == "add_group_subscription")
+@admin_router.callback_query(F.data == "add_group_subscription")
 async def add_group_subscription(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(SubscriptionState.wait_subscription_add)
     await state.update_data(sub_type="group")
     
@@ -1137,15 +1660,11 @@ async def add_group_subscription(cb: CallbackQuery, state: FSMContext):
         "3. Название может содержать пробелы\n"
         "4. Пользователь должен быть участником группы\n"
         "5. Бот должен быть администратором группы",
-        parse_mode='HTML',
         reply_markup=subscription_cancel_menu()
     )
 
-@dp.message(SubscriptionState.wait_subscription_add)
+@admin_router.message(SubscriptionState.wait_subscription_add)
 async def process_subscription_add(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     data = await state.get_data()
     sub_type = data.get("sub_type")
     
@@ -1166,9 +1685,8 @@ async def process_subscription_add(msg: Message, state: FSMContext):
         
         url = f"https://t.me/{username.lstrip('@')}"
         
-        for sub in REQUIRED_SUBSCRIPTIONS:
-            if sub["type"] == "channel" and (str(sub["id"]) == str(channel_id) or sub["username"] == username):
-                return await msg.answer(f"❌ Канал уже есть в списке.")
+        if is_subscription_added("channel", channel_id, username):
+            return await msg.answer(f"❌ Канал уже есть в списке.")
         
         new_sub = {
             "type": "channel",
@@ -1188,11 +1706,10 @@ async def process_subscription_add(msg: Message, state: FSMContext):
             f"<b>ID:</b> <code>{channel_id}</code>\n"
             f"<b>Юзернейм:</b> {username}\n"
             f"<b>Ссылка:</b> {url}",
-            parse_mode='HTML',
             reply_markup=subscriptions_menu()
         )
         
-        await log("subscription_add", f"admin {msg.from_user.id} added channel {channel_id} ({name})")
+        log("subscription_add", f"admin {msg.from_user.id} added channel {channel_id} ({name})")
     
     elif sub_type == "group":
         parts = msg.text.split(maxsplit=2)
@@ -1211,9 +1728,8 @@ async def process_subscription_add(msg: Message, state: FSMContext):
         
         url = f"https://t.me/{username.lstrip('@')}"
         
-        for sub in REQUIRED_SUBSCRIPTIONS:
-            if sub["type"] == "group" and (str(sub["id"]) == str(group_id) or sub["username"] == username):
-                return await msg.answer(f"❌ Группа уже есть в списке.")
+        if is_subscription_added("group", group_id, username):
+            return await msg.answer(f"❌ Группа уже есть в списке.")
         
         try:
             bot_member = await bot.get_chat_member(chat_id=group_id, user_id=bot.id)
@@ -1222,17 +1738,15 @@ async def process_subscription_add(msg: Message, state: FSMContext):
                     f"⚠️ <b>Предупреждение!</b>\n\n"
                     f"Бот не является администратором в группе '{name}'.\n"
                     f"Для корректной проверки подписок бот должен быть администратором.\n\n"
-                    f"Группа все равно будет добавлена, но проверка может не работать.",
-                    parse_mode='HTML'
+                    f"Группа все равно будет добавлена, но проверка может не работать."
                 )
         except Exception as e:
-            logger.error(f"Ошибка проверки прав бота в группе: {e}")
+            logger.error("Ошибка проверки прав бота в группе: %s", e)
             await msg.answer(
                 f"⚠️ <b>Предупреждение!</b>\n\n"
                 f"Не удалось проверить права бота в группе '{name}'.\n"
                 f"Убедитесь, что бот добавлен в группу и является администратором.\n\n"
-                f"Группа все равно будет добавлена.",
-                parse_mode='HTML'
+                f"Группа все равно будет добавлена."
             )
         
         new_sub = {
@@ -1253,95 +1767,65 @@ async def process_subscription_add(msg: Message, state: FSMContext):
             f"<b>ID:</b> <code>{group_id}</code>\n"
             f"<b>Юзернейм:</b> {username}\n"
             f"<b>Ссылка:</b> {url}",
-            parse_mode='HTML',
             reply_markup=subscriptions_menu()
         )
         
-        await log("subscription_add", f"admin {msg.from_user.id} added group {group_id} ({name})")
+        log("subscription_add", f"admin {msg.from_user.id} added group {group_id} ({name})")
     
     await state.clear()
 
-@dp.callback_query(F.data == "remove_subscription")
+@admin_router.callback_query(F.data == "remove_subscription")
 async def remove_subscription(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     if not REQUIRED_SUBSCRIPTIONS:
         return await cb.answer("📋 Список подписок пуст.", show_alert=True)
     
-    keyboard = []
-    
-    for i, sub in enumerate(REQUIRED_SUBSCRIPTIONS, 1):
-        if sub["type"] == "channel":
-            emoji = "📢"
-        elif sub["type"] == "group":
-            emoji = "👥"
-        else:
-            emoji = "🤖"
-            
-        keyboard.append([
-            InlineKeyboardButton(
-                text=f"{i}. {emoji} {sub['name']}",
-                callback_data=f"remove_sub_{i-1}"
-            )
-        ])
-    
+    keyboard = [
+        [InlineKeyboardButton(text=f"{i}. {sub['emoji']} {sub['name']}", callback_data=f"{CB_REMOVE_SUB}{i-1}")]
+        for i, sub in enumerate(REQUIRED_SUBSCRIPTIONS, 1)
+    ]
     keyboard.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="manage_subscriptions")])
     
     await cb.message.edit_text(
         "🗑️ <b>Удаление подписки</b>\n\n"
         "Выберите подписку для удаления:",
-        parse_mode='HTML',
         reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
     )
 
-@dp.callback_query(F.data.startswith("remove_sub_"))
+@admin_router.callback_query(F.data.startswith(CB_REMOVE_SUB))
 async def process_remove_subscription(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        index = int(cb.data.split("_")[2])
+        index = int(cb.data.removeprefix(CB_REMOVE_SUB))
         if 0 <= index < len(REQUIRED_SUBSCRIPTIONS):
             removed_sub = REQUIRED_SUBSCRIPTIONS.pop(index)
+            # Снимаем «часики» с кнопки сразу, не дожидаясь записи в БД
+            await cb.answer()
             
             await save_subscriptions_to_db()
             
-            if removed_sub["type"] == "channel":
-                emoji = "📢"
-            elif removed_sub["type"] == "group":
-                emoji = "👥"
-            else:
-                emoji = "🤖"
-                
             await cb.message.edit_text(
                 f"✅ Подписка удалена:\n\n"
-                f"{emoji} <b>{removed_sub['name']}</b>\n"
+                f"{removed_sub['emoji']} <b>{removed_sub['name']}</b>\n"
                 f"Тип: {removed_sub['type']}\n"
                 f"Юзернейм: {removed_sub['username']}\n"
                 f"Ссылка: {removed_sub['url']}",
-                parse_mode='HTML',
                 reply_markup=subscriptions_menu()
             )
             
-            await log("subscription_remove", f"admin {cb.from_user.id} removed {removed_sub['type']} {removed_sub['username']}")
+            log("subscription_remove", f"admin {cb.from_user.id} removed {removed_sub['type']} {removed_sub['username']}")
         else:
             await cb.answer("❌ Неверный индекс подписки.", show_alert=True)
     except (ValueError, IndexError):
         await cb.answer("❌ Ошибка при удалении подписки.", show_alert=True)
 
-@dp.callback_query(F.data == "refresh_subscriptions")
+@admin_router.callback_query(F.data == "refresh_subscriptions")
 async def refresh_subscriptions(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await load_subscriptions_from_db()
     await cb.answer("✅ Список подписок обновлен из базы данных.", show_alert=True)
 
 # ================== ADMINS PAGE ==================
 @dp.callback_query(F.data == "admins")
 async def admins_page(cb: CallbackQuery):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
     
     text = (
@@ -1360,33 +1844,34 @@ async def admins_page(cb: CallbackQuery):
         "✉️ <b>Пишите нам, мы всегда на связи!</b>"
     )
     
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=admins_keyboard())
+    await cb.message.edit_text(text, reply_markup=admins_keyboard())
 
 # ================== OFFER ==================
+POST_TYPE_TEXT = (
+    "Выберите тип поста:\n\n"
+    "⚠️ <b>Важно:</b>\n"
+    "Помните о правилах публикации"
+)
+
+POST_SENT_TEXT = (
+    "✅ Ваш пост отправлен на модерацию.\n"
+    "Мы сообщим вам о итогах, как только наши модераторы рассмотрят пост"
+)
+
 @dp.callback_query(F.data == "offer")
 async def offer(cb: CallbackQuery):
-    if await is_banned(cb.from_user.id):
+    user_id = cb.from_user.id
+    if is_banned(user_id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
-    if await posts_today(cb.from_user.id) >= 5:
+    if posts_today(user_id) >= 5:
         return await cb.answer("🔒 Лимит: 5 постов в день.", show_alert=True)
 
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📷 С фото", callback_data="with_photo")],
-        [InlineKeyboardButton(text="📝 Без фото", callback_data="no_photo")],
-        [InlineKeyboardButton(text="⬅ Назад", callback_data="menu")]
-    ])
-    await cb.message.edit_text(
-        "Выберите тип поста:\n\n"
-        "⚠️ <b>Важно:</b>\n"
-        "Помните о правилах публикации",
-        parse_mode='HTML',
-        reply_markup=kb
-    )
+    await cb.message.edit_text(POST_TYPE_TEXT, reply_markup=POST_TYPE_KB)
 
 # ================== WITH PHOTO ==================
 @dp.callback_query(F.data == "with_photo")
 async def with_photo(cb: CallbackQuery, state: FSMContext):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
     
     await state.set_state(PostState.wait_photo)
@@ -1397,39 +1882,39 @@ async def with_photo(cb: CallbackQuery, state: FSMContext):
 
 @dp.message(PostState.wait_photo)
 async def get_photo(msg: Message, state: FSMContext):
-    if await is_banned(msg.from_user.id):
+    if is_banned(msg.from_user.id):
         return await msg.answer("🚫 Вы заблокированы и не можете отправлять посты.")
     
     if not msg.photo:
         return await msg.answer("❗ Нужно отправить именно фото.", reply_markup=back_to_previous())
     
-    await state.update_data(photo=msg.photo[-1].file_id)
+    largest = msg.photo[-1]
+    await state.update_data(photo=largest.file_id, photo_unique_id=largest.file_unique_id)
     await state.set_state(PostState.wait_text_after_photo)
     
     await msg.answer(
         "✅ Фото принято.\n\n"
         "📝 <b>Теперь пришли текст к фото:</b>\n\n"
         "⚠️ Не забудьте добавить 🧑 или 👩 в текст!",
-        parse_mode='HTML',
         reply_markup=back_to_post_type()
     )
 
 @dp.message(PostState.wait_text_after_photo)
 async def get_text_after_photo(msg: Message, state: FSMContext):
-    if await is_banned(msg.from_user.id):
+    user_id = msg.from_user.id
+    if is_banned(user_id):
         return await msg.answer("🚫 Вы заблокированы и не можете отправлять посты.")
     
     data = await state.get_data()
     
-    is_blacklisted, keyword = await is_in_publication_blacklist(msg.text)
+    is_blacklisted, keyword = is_in_publication_blacklist(msg.text)
     if is_blacklisted:
         await msg.answer(
             f"❌ <b>Публикация отклонена</b>\n\n"
             f"Текст содержит слово из списка запрещённых на публикацию: <code>{keyword}</code>\n",
-            parse_mode='HTML',
             reply_markup=menu_btn()
         )
-        await log("blacklist_reject", f"user {msg.from_user.id}: keyword '{keyword}'")
+        log("blacklist_reject", f"user {user_id}: keyword '{keyword}'")
         await state.clear()
         return
     
@@ -1437,36 +1922,27 @@ async def get_text_after_photo(msg: Message, state: FSMContext):
     if not is_valid:
         await msg.answer(
             error_message,
-            parse_mode='HTML',
             reply_markup=back_to_post_type()
         )
         return
     
     await state.clear()
 
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute(
-            "INSERT INTO posts(user_id, text, photo, time, status) VALUES(?,?,?,?,?)",
-            (msg.from_user.id, msg.text, data["photo"], str(datetime.now()), "moderation")
-        )
-        post_id = cursor.lastrowid
-        await db.commit()
+    post_id = await create_post(user_id, msg.text, data["photo"], data.get("photo_unique_id"))
 
-    logger.info(f"Создан пост #{post_id} с фото от пользователя {msg.from_user.id}")
+    logger.info("Создан пост #%s с фото от пользователя %s", post_id, user_id)
     
-    await msg.answer(
-        "✅ Ваш пост отправлен на модерацию.\n"
-        "Мы сообщим вам о итогах, как только наши модераторы рассмотрят пост",
-        reply_markup=menu_btn()
+    # Ответ автору и отправка модераторам независимы — выполняем их одновременно
+    await asyncio.gather(
+        msg.answer(POST_SENT_TEXT, reply_markup=menu_btn()),
+        send_to_moderation(post_id)
     )
-    
-    await send_to_moderation(post_id)
-    await log("new_post", f"photo post #{post_id} from user {msg.from_user.id}")
+    log("new_post", f"photo post #{post_id} from user {user_id}")
 
 # ================== NO PHOTO ==================
 @dp.callback_query(F.data == "no_photo")
 async def no_photo(cb: CallbackQuery, state: FSMContext):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("Вы заблокированы.", show_alert=True)
     
     await state.set_state(PostState.wait_text_only)
@@ -1478,18 +1954,18 @@ async def no_photo(cb: CallbackQuery, state: FSMContext):
 
 @dp.message(PostState.wait_text_only)
 async def get_text_only(msg: Message, state: FSMContext):
-    if await is_banned(msg.from_user.id):
+    user_id = msg.from_user.id
+    if is_banned(user_id):
         return await msg.answer("🚫 Вы заблокированы и не можете отправлять посты.")
     
-    is_blacklisted, keyword = await is_in_publication_blacklist(msg.text)
+    is_blacklisted, keyword = is_in_publication_blacklist(msg.text)
     if is_blacklisted:
         await msg.answer(
             f"❌ <b>Публикация отклонена</b>\n\n"
             f"Текст содержит слово из списка запрещённых на публикацию: <code>{keyword}</code>",
-            parse_mode='HTML',
             reply_markup=menu_btn()
         )
-        await log("blacklist_reject", f"user {msg.from_user.id}: keyword '{keyword}'")
+        log("blacklist_reject", f"user {user_id}: keyword '{keyword}'")
         await state.clear()
         return
     
@@ -1497,208 +1973,272 @@ async def get_text_only(msg: Message, state: FSMContext):
     if not is_valid:
         await msg.answer(
             error_message,
-            parse_mode='HTML',
             reply_markup=back_to_post_type()
         )
         return
     
     await state.clear()
 
-    async with aiosqlite.connect(DB_NAME) as db:
-        cursor = await db.execute(
-            "INSERT INTO posts(user_id, text, photo, time, status) VALUES(?,?,?,?,?)",
-            (msg.from_user.id, msg.text, None, str(datetime.now()), "moderation")
-        )
-        post_id = cursor.lastrowid
-        await db.commit()
+    post_id = await create_post(user_id, msg.text)
 
-    logger.info(f"Создан текстовый пост #{post_id} от пользователя {msg.from_user.id}")
+    logger.info("Создан текстовый пост #%s от пользователя %s", post_id, user_id)
     
-    await msg.answer(
-        "✅ Ваш пост отправлен на модерацию.\n"
-        "Мы сообщим вам о итогах, как только наши модераторы рассмотрят пост",
-        reply_markup=menu_btn()
+    # Ответ автору и отправка модераторам независимы — выполняем их одновременно
+    await asyncio.gather(
+        msg.answer(POST_SENT_TEXT, reply_markup=menu_btn()),
+        send_to_moderation(post_id)
     )
-    
-    await send_to_moderation(post_id)
-    await log("new_post", f"text post #{post_id} from user {msg.from_user.id}")
+    log("new_post", f"text post #{post_id} from user {user_id}")
 
 @dp.callback_query(F.data == "back_to_previous_step")
 async def back_to_previous_step(cb: CallbackQuery, state: FSMContext):
+    user_id = cb.from_user.id
     await state.clear()
     
-    if await is_banned(cb.from_user.id):
+    if is_banned(user_id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
-    if await posts_today(cb.from_user.id) >= 5:
+    if posts_today(user_id) >= 5:
         return await cb.answer("🔒 Лимит: 5 постов в день.", show_alert=True)
 
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📷 С фото", callback_data="with_photo")],
-        [InlineKeyboardButton(text="📝 Без фото", callback_data="no_photo")],
-        [InlineKeyboardButton(text="⬅ Назад", callback_data="menu")]
-    ])
-    
-    await cb.message.edit_text(
-        "Выберите тип поста:\n\n"
-        "⚠️ <b>Важно:</b>\n"
-        "Помните о правилах публикации",
-        parse_mode='HTML',
-        reply_markup=kb
-    )
+    await cb.message.edit_text(POST_TYPE_TEXT, reply_markup=POST_TYPE_KB)
     await cb.answer()
 
+# ================== УВЕДОМЛЕНИЯ ==================
+class ModeratorNotifier:
+    """Короткие уведомления в тему модерации через одну фоновую задачу.
+
+    Первое уведомление уходит сразу, а всё, что накопилось за паузу между отправками,
+    объединяется в одно сообщение — в пики модерации тема не упирается в лимит Telegram
+    на количество сообщений в группе.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Отправляет накопившиеся уведомления и останавливает фоновую задачу"""
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+
+    def enqueue(self, text: str):
+        self.queue.put_nowait(text)
+
+    async def run(self):
+        while True:
+            items = [await self.queue.get()]
+            while not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            
+            # None в очереди означает остановку: отправляем то, что пришло до него
+            stop = None in items
+            texts = [item for item in items if item is not None]
+            if texts:
+                await self.send(texts)
+            if stop:
+                return
+            await asyncio.sleep(self.interval)
+
+    @staticmethod
+    async def send(texts: List[str]):
+        if len(texts) == 1:
+            messages = texts
+        else:
+            # Сводка по пунктам, с разбиением по лимиту длины сообщения
+            messages, current = [], ""
+            for text in texts:
+                line = f"• {text}\n"
+                if current and len(current) + len(line) > 4000:
+                    messages.append(current)
+                    current = ""
+                current += line
+            messages.append(current)
+        
+        for text in messages:
+            try:
+                await bot.send_message(
+                    chat_id=MODERATORS_CHAT_ID,
+                    message_thread_id=MODERATORS_TOPIC_ID,
+                    text=text
+                )
+            except Exception as e:
+                logger.error("Ошибка отправки уведомления модераторам: %s", e)
+
+MODERATOR_NOTIFY_INTERVAL = 3
+moderator_notifier = ModeratorNotifier(MODERATOR_NOTIFY_INTERVAL)
+
+class UserNotifier:
+    """Личные уведомления пользователям (автору поста, заблокированному) через очередь.
+
+    Обработчик не ждёт доставки, а отправка ограничена корзиной токенов, чтобы пики
+    модерации не упирались в общий лимит Telegram на сообщения в секунду.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = 0.0
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.sending: set = set()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.updated = time.monotonic()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Отправляет оставшиеся уведомления и останавливает фоновую задачу"""
+        if self.task is None:
+            return
+        await self.queue.put(None)
+        await self.task
+        if self.sending:
+            await asyncio.gather(*self.sending)
+
+    def enqueue(self, user_id: int, text: str, **kwargs):
+        self.queue.put_nowait((user_id, text, kwargs))
+
+    async def acquire(self):
+        """Ждёт свободный токен; запас пополняется со скоростью rate в секунду, не больше rate штук"""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            await self.acquire()
+            # Сам запрос не ждём: иначе скорость ограничивала бы задержка Telegram, а не лимит
+            task = asyncio.create_task(self.send(*item))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    @staticmethod
+    async def send(user_id: int, text: str, kwargs: dict):
+        try:
+            await bot.send_message(user_id, text, **kwargs)
+        except Exception as e:
+            logger.warning("Не удалось уведомить пользователя %s: %s", user_id, e)
+
+USER_NOTIFY_RATE = 30
+user_notifier = UserNotifier(USER_NOTIFY_RATE)
+
 # ================== ОТПРАВКА НА МОДЕРАЦИЮ ==================
+# Темы, отправка в которые не удалась из-за самой темы: (chat_id, topic_id).
+# В такие чаты сразу отправляем без темы, не тратя на каждый пост заведомо неудачный запрос.
+BROKEN_TOPICS: set = set()
+
+async def send_to_topic(chat_id: int, topic_id: int, text: str, photo: Optional[str] = None, **kwargs) -> Message:
+    """Отправляет текст или фото с подписью в тему чата; при ошибке повторяет отправку без темы"""
+    async def send(**extra):
+        if photo:
+            return await bot.send_photo(chat_id=chat_id, photo=photo, caption=text, **kwargs, **extra)
+        return await bot.send_message(chat_id=chat_id, text=text, **kwargs, **extra)
+    
+    if (chat_id, topic_id) not in BROKEN_TOPICS:
+        try:
+            return await send(message_thread_id=topic_id)
+        except Exception as e:
+            logger.error("Ошибка отправки в тему %s чата %s: %s", topic_id, chat_id, e)
+            if isinstance(e, TelegramBadRequest) and "thread" in str(e).lower():
+                BROKEN_TOPICS.add((chat_id, topic_id))
+    
+    sent_msg = await send()
+    logger.info("Сообщение отправлено в чат %s без указания темы", chat_id)
+    return sent_msg
+
+# Шаблоны карточек поста для тем модерации и администраторов
+MODERATION_TEXT_FMT = "📨 <b>Новый пост #{post_id} на модерации</b>\n\n{text}"
+ADMIN_POST_TEXT_FMT = (
+    "📨 <b>Новый пост #{post_id} на модерации</b>\n\n"
+    "📄 <b>Текст:</b>\n{text}\n\n"
+    "👤 <b>Автор:</b> @{username}\n"
+    "🆔 <b>ID автора:</b> <code>{user_id}</code>\n"
+    "📅 <b>Время отправки:</b> {time}"
+)
+
 async def send_to_moderation(post_id: int):
     try:
-        logger.info(f"Отправляю пост #{post_id} на модерацию...")
+        logger.info("Отправляю пост #%s на модерацию...", post_id)
         
-        async with aiosqlite.connect(DB_NAME) as db:
-            cur = await db.execute(
-                "SELECT text, photo FROM posts WHERE id=?",
-                (post_id,)
-            )
-            row = await cur.fetchone()
+        # Одним запросом берём и данные для сообщения администраторам
+        row = await db_readers.fetchone("""
+            SELECT p.text, p.photo, p.time, p.user_id, u.username 
+            FROM posts p 
+            LEFT JOIN users u ON p.user_id = u.user_id 
+            WHERE p.id=?
+        """, (post_id,))
 
         if not row:
-            logger.error(f"Пост #{post_id} не найден в базе данных")
+            logger.error("Пост #%s не найден в базе данных", post_id)
             return
 
-        text, photo = row
+        text, photo = row[:2]
         
-        moderation_text = f"📨 <b>Новый пост #{post_id} на модерации</b>\n\n{text}"
+        moderation_text = MODERATION_TEXT_FMT.format(post_id=post_id, text=text)
         
         try:
-            if photo:
-                sent_msg = await bot.send_photo(
-                    chat_id=MODERATORS_CHAT_ID,
-                    message_thread_id=MODERATORS_TOPIC_ID,
-                    photo=photo,
-                    caption=moderation_text,
-                    parse_mode='HTML',
-                    reply_markup=moderation_keyboard(post_id)
-                )
-            else:
-                sent_msg = await bot.send_message(
-                    chat_id=MODERATORS_CHAT_ID,
-                    message_thread_id=MODERATORS_TOPIC_ID,
-                    text=moderation_text,
-                    parse_mode='HTML',
-                    reply_markup=moderation_keyboard(post_id)
-                )
-            
-            logger.info(f"✅ Пост #{post_id} отправлен модераторам")
+            sent_msg = await send_to_topic(
+                MODERATORS_CHAT_ID, MODERATORS_TOPIC_ID, moderation_text, photo,
+                reply_markup=moderation_keyboard(post_id)
+            )
+            logger.info("✅ Пост #%s отправлен модераторам", post_id)
             await update_post_message_ids(post_id, moderators_message_id=sent_msg.message_id)
-                
         except Exception as e:
-            logger.error(f"Ошибка отправки поста #{post_id} модераторам: {e}")
-            try:
-                if photo:
-                    sent_msg = await bot.send_photo(
-                        chat_id=MODERATORS_CHAT_ID,
-                        photo=photo,
-                        caption=moderation_text,
-                        parse_mode='HTML',
-                        reply_markup=moderation_keyboard(post_id)
-                    )
-                else:
-                    sent_msg = await bot.send_message(
-                        chat_id=MODERATORS_CHAT_ID,
-                        text=moderation_text,
-                        parse_mode='HTML',
-                        reply_markup=moderation_keyboard(post_id)
-                    )
-                await update_post_message_ids(post_id, moderators_message_id=sent_msg.message_id)
-                logger.info(f"✅ Пост #{post_id} отправлен модераторам без указания темы")
-            except Exception as e2:
-                logger.error(f"Критическая ошибка отправки поста #{post_id} модераторам: {e2}")
+            logger.error("Критическая ошибка отправки поста #%s модераторам: %s", post_id, e)
         
-        await send_to_admins(post_id)
+        await send_to_admins(post_id, row)
             
     except Exception as e:
-        logger.error(f"Общая ошибка при отправке поста #{post_id} на модерацию: {e}")
+        logger.error("Общая ошибка при отправке поста #%s на модерацию: %s", post_id, e)
 
-async def send_to_admins(post_id: int):
+async def send_to_admins(post_id: int, row: tuple):
+    """row — (text, photo, time, user_id, username), уже выбранные в send_to_moderation"""
     try:
-        logger.info(f"Отправляю пост #{post_id} администраторам...")
-        
-        async with aiosqlite.connect(DB_NAME) as db:
-            cur = await db.execute("""
-                SELECT p.text, p.photo, p.time, p.user_id, u.username 
-                FROM posts p 
-                LEFT JOIN users u ON p.user_id = u.user_id 
-                WHERE p.id=?
-            """, (post_id,))
-            row = await cur.fetchone()
-
-        if not row:
-            logger.error(f"Пост #{post_id} не найден для администраторов")
-            return
-
+        logger.info("Отправляю пост #%s администраторам...", post_id)
+        
         text, photo, time, user_id, username = row
         
-        try:
-            post_time = datetime.fromisoformat(time)
-            formatted_time = post_time.strftime('%d.%m.%Y %H:%M:%S')
-        except:
-            formatted_time = time
+        formatted_time = format_db_time(time, '%d.%m.%Y %H:%M:%S')
 
-        admin_text = (
-            f"📨 <b>Новый пост #{post_id} на модерации</b>\n\n"
-            f"📄 <b>Текст:</b>\n{text}\n\n"
-            f"👤 <b>Автор:</b> @{username or 'без username'}\n"
-            f"🆔 <b>ID автора:</b> <code>{user_id}</code>\n"
-            f"📅 <b>Время отправки:</b> {formatted_time}"
+        admin_text = ADMIN_POST_TEXT_FMT.format(
+            post_id=post_id,
+            text=text,
+            username=username or 'без username',
+            user_id=user_id,
+            time=formatted_time
         )
         
         try:
-            if photo:
-                sent_msg = await bot.send_photo(
-                    chat_id=ADMINS_CHAT_ID,
-                    message_thread_id=ADMINS_TOPIC_ID,
-                    photo=photo,
-                    caption=admin_text,
-                    parse_mode='HTML'
-                )
-            else:
-                sent_msg = await bot.send_message(
-                    chat_id=ADMINS_CHAT_ID,
-                    message_thread_id=ADMINS_TOPIC_ID,
-                    text=admin_text,
-                    parse_mode='HTML'
-                )
-            
+            sent_msg = await send_to_topic(ADMINS_CHAT_ID, ADMINS_TOPIC_ID, admin_text, photo)
             await update_post_message_ids(post_id, admins_message_id=sent_msg.message_id)
-            logger.info(f"✅ Пост #{post_id} отправлен администраторам")
-            
+            logger.info("✅ Пост #%s отправлен администраторам", post_id)
         except Exception as e:
-            logger.error(f"Ошибка отправки поста #{post_id} администраторам: {e}")
-            try:
-                if photo:
-                    sent_msg = await bot.send_photo(
-                        chat_id=ADMINS_CHAT_ID,
-                        photo=photo,
-                        caption=admin_text,
-                        parse_mode='HTML'
-                    )
-                else:
-                    sent_msg = await bot.send_message(
-                        chat_id=ADMINS_CHAT_ID,
-                        text=admin_text,
-                        parse_mode='HTML'
-                    )
-                await update_post_message_ids(post_id, admins_message_id=sent_msg.message_id)
-                logger.info(f"✅ Пост #{post_id} отправлен администраторам без указания темы")
-            except Exception as e2:
-                logger.error(f"Критическая ошибка отправки поста #{post_id} администраторам: {e2}")
+            logger.error("Критическая ошибка отправки поста #%s администраторам: %s", post_id, e)
         
     except Exception as e:
-        logger.error(f"Общая ошибка при отправке поста #{post_id} администраторам: {e}")
+        logger.error("Общая ошибка при отправке поста #%s администраторам: %s", post_id, e)
 
 # ================== КТО ОПУБЛИКОВАЛ/ОТКЛОНИЛ ==================
-@dp.callback_query(F.data.startswith("who_pub_"))
+@dp.callback_query(F.data.startswith(CB_WHO_PUB))
 async def who_published(cb: CallbackQuery):
     try:
-        post_id = int(cb.data.split("_")[2])
+        post_id = int(cb.data.removeprefix(CB_WHO_PUB))
     except (ValueError, IndexError):
         return await cb.answer("❌ Неверный ID поста", show_alert=True)
     
@@ -1717,14 +2257,13 @@ async def who_published(cb: CallbackQuery):
     await cb.answer()
     await bot.send_message(
         chat_id=cb.message.chat.id,
-        text=text,
-        parse_mode='HTML'
+        text=text
     )
 
-@dp.callback_query(F.data.startswith("who_rej_"))
+@dp.callback_query(F.data.startswith(CB_WHO_REJ))
 async def who_rejected(cb: CallbackQuery):
     try:
-        post_id = int(cb.data.split("_")[2])
+        post_id = int(cb.data.removeprefix(CB_WHO_REJ))
     except (ValueError, IndexError):
         return await cb.answer("❌ Неверный ID поста", show_alert=True)
     
@@ -1744,18 +2283,17 @@ async def who_rejected(cb: CallbackQuery):
     await cb.answer()
     await bot.send_message(
         chat_id=cb.message.chat.id,
-        text=text,
-        parse_mode='HTML'
+        text=text
     )
 
 # ================== ПУБЛИКАЦИЯ ==================
-@dp.callback_query(F.data.startswith("pub_"))
+@dp.callback_query(F.data.startswith(CB_PUB))
 async def confirm_pub(cb: CallbackQuery):
-    if not await validate_chat_for_moderation(cb):
+    if not validate_chat_for_moderation(cb):
         return await cb.answer("⚠️ Это действие доступно только в теме модерации", show_alert=True)
     
     try:
-        pid = int(cb.data.split("_")[1])
+        pid = int(cb.data.removeprefix(CB_PUB))
     except ValueError:
         return await cb.answer("Неверный ID поста", show_alert=True)
     
@@ -1767,10 +2305,7 @@ async def confirm_pub(cb: CallbackQuery):
         await cb.answer("❌ Этот пост уже отклонен!", show_alert=True)
         return
     
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="✅ Да, опубликовать", callback_data=f"yes_{pid}")],
-        [InlineKeyboardButton(text="❌ Нет, отменить", callback_data=f"no_{pid}")]
-    ])
+    kb = publish_confirm_keyboard(pid)
     
     await bot.send_message(
         chat_id=MODERATORS_CHAT_ID,
@@ -1780,125 +2315,117 @@ async def confirm_pub(cb: CallbackQuery):
     )
     await cb.answer()
 
-@dp.callback_query(F.data.startswith("yes_"))
+@dp.callback_query(F.data.startswith(CB_YES))
 async def publish(cb: CallbackQuery):
-    if not await validate_chat_for_moderation(cb):
+    if not validate_chat_for_moderation(cb):
         return await cb.answer("⚠️ Это действие доступно только в теме модерации", show_alert=True)
     
     try:
-        pid = int(cb.data.split("_")[1])
+        pid = int(cb.data.removeprefix(CB_YES))
     except ValueError:
         return await cb.answer("Неверный ID поста", show_alert=True)
 
-    current_status = await get_post_status(pid)
-    if current_status in ["published", "rejected"]:
-        await cb.answer(f"❌ Этот пост уже {'опубликован' if current_status == 'published' else 'отклонен'}!", show_alert=True)
-        return
-
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT text, photo, user_id FROM posts WHERE id=?",
-            (pid,)
-        )
-        row = await cur.fetchone()
-
-        if not row:
-            return await cb.answer("Пост не найден", show_alert=True)
-
-        text, photo, user_id = row
-        
-        try:
-            if photo:
-                await bot.send_photo(MAIN_CHANNEL_ID, photo, caption=text)
-            else:
-                await bot.send_message(MAIN_CHANNEL_ID, text)
-        except Exception as e:
-            logger.error(f"Ошибка публикации поста #{pid} в канал: {e}")
-            return await cb.answer(f"Ошибка публикации: {e}", show_alert=True)
-
-        await db.execute(
-            "UPDATE posts SET status='published', moderator_id=?, moderation_time=? WHERE id=?",
-            (cb.from_user.id, str(datetime.now()), pid)
-        )
-        await db.commit()
-
-        await update_admin_message_status(pid, "published")
+    row = await claim_post_for_publish(pid, cb.from_user.id)
+    if not row:
+        # Статус читаем только на этом редком пути, чтобы ответить точнее
+        current_status = await get_post_status(pid)
+        if current_status in ["published", "rejected"]:
+            return await cb.answer(f"❌ Этот пост уже {'опубликован' if current_status == 'published' else 'отклонен'}!", show_alert=True)
+        return await cb.answer("Пост не найден", show_alert=True)
 
-        try:
-            await bot.send_message(
-                user_id,
-                "🎉 Ваш пост был опубликован в канале!"
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось уведомить пользователя {user_id}: {e}")
+    text, photo, user_id = row
+    
+    try:
+        if photo:
+            await bot.send_photo(MAIN_CHANNEL_ID, photo, caption=text, parse_mode=None)
+        else:
+            await bot.send_message(MAIN_CHANNEL_ID, text, parse_mode=None)
+    except Exception as e:
+        logger.error("Ошибка публикации поста #%s в канал: %s", pid, e)
+        await release_post(pid)
+        return await cb.answer(f"Ошибка публикации: {e}", show_alert=True)
 
-    await log("publish", str(pid))
+    user_notifier.enqueue(user_id, "🎉 Ваш пост был опубликован в канале!")
+    await update_admin_message_status(pid, "published")
+
+    log("publish", str(pid))
     
-    await bot.send_message(
-        chat_id=MODERATORS_CHAT_ID,
-        message_thread_id=MODERATORS_TOPIC_ID,
-        text="✅ Пост опубликован"
-    )
+    moderator_notifier.enqueue(f"✅ Пост #{pid} опубликован")
     await cb.answer()
 
-@dp.callback_query(F.data.startswith("no_"))
+@dp.callback_query(F.data.startswith(CB_NO))
 async def cancel_pub(cb: CallbackQuery):
-    if not await validate_chat_for_moderation(cb):
+    if not validate_chat_for_moderation(cb):
         return await cb.answer("⚠️ Это действие доступно только в теме модерации", show_alert=True)
     
-    await bot.send_message(
-        chat_id=MODERATORS_CHAT_ID,
-        message_thread_id=MODERATORS_TOPIC_ID,
-        text="❌ Действие отменено."
-    )
+    moderator_notifier.enqueue("❌ Действие отменено.")
     await cb.answer()
 
 # ================== ОТКЛОНЕНИЕ ==================
-async def reset_reject_state(post_id: int, message_id: int, chat_id: int, text: str, photo: str = None):
+# Текст карточки модерации при отказе не меняется, поэтому меняем только клавиатуру:
+# edit_message_reply_markup не пересылает текст/подпись и не зависит от наличия фото
+async def reset_reject_state(post_id: int, message_id: int, chat_id: int):
     try:
-        if photo:
-            await bot.edit_message_caption(
-                chat_id=chat_id,
-                message_id=message_id,
-                caption=text,
-                parse_mode='HTML',
-                reply_markup=moderation_keyboard(post_id)
-            )
-        else:
-            await bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=message_id,
-                text=text,
-                parse_mode='HTML',
-                reply_markup=moderation_keyboard(post_id)
-            )
-        logger.info(f"✅ Состояние отказа для поста #{post_id} сброшено")
+        await bot.edit_message_reply_markup(
+            chat_id=chat_id,
+            message_id=message_id,
+            reply_markup=moderation_keyboard(post_id)
+        )
+        logger.info("✅ Состояние отказа для поста #%s сброшено", post_id)
     except TelegramBadRequest as e:
         if "message is not modified" not in str(e):
-            logger.error(f"Ошибка при сбросе состояния отказа: {e}")
+            logger.error("Ошибка при сбросе состояния отказа: %s", e)
     except Exception as e:
-        logger.error(f"Ошибка при сбросе состояния отказа: {e}")
+        logger.error("Ошибка при сбросе состояния отказа: %s", e)
 
-async def reject_timeout_handler(state: FSMContext, post_id: int, message_id: int, 
-                                chat_id: int, original_text: str, photo: str = None):
-    await asyncio.sleep(60)
-    
+async def reject_timeout_handler(state: FSMContext, post_id: int, started_at: float, message_id: int,
+                                chat_id: int):
     data = await state.get_data()
-    current_post_id = data.get("post_id")
     
-    if current_post_id == post_id:
+    # started_at отличает этот запрос причины от повторного отказа по тому же посту
+    if data.get("post_id") == post_id and data.get("timestamp") == started_at:
         current_state = await state.get_state()
-        if current_state == RejectState.wait_reason.state:
+        # Часть длинной причины уже принята — отказ завершит finish_reject_after_delay
+        if current_state == RejectState.wait_reason.state and data.get("pending_reason") is None:
             await state.clear()
-            await reset_reject_state(post_id, message_id, chat_id, original_text, photo)
+            await reset_reject_state(post_id, message_id, chat_id)
+
+# Таймауты ожидания причины отказа: куча (срок по time.monotonic(), порядковый номер, аргументы
+# reject_timeout_handler). Все сроки обслуживает одна задача вместо отдельной задачи на каждый отказ.
+REJECT_TIMEOUT = 60
+# Причина, пришедшая позже этого срока, не принимается (запас на задержку таймера)
+REJECT_REASON_DEADLINE = 70
+REJECT_TIMERS: List[Tuple[float, int, tuple]] = []
+REJECT_TIMER_SEQ = itertools.count()
+reject_timer_task: Optional[asyncio.Task] = None
+
+async def reject_timer_loop():
+    """Спит до ближайшего срока и обрабатывает истёкшие таймауты; завершается, когда куча пуста"""
+    while REJECT_TIMERS:
+        delay = REJECT_TIMERS[0][0] - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+            continue
+        _, _, args = heapq.heappop(REJECT_TIMERS)
+        try:
+            await reject_timeout_handler(*args)
+        except Exception as e:
+            logger.error("Ошибка обработки таймаута отказа для поста #%s: %s", args[1], e)
+
+def schedule_reject_timeout(*args):
+    """Ставит таймаут в кучу; срок у всех одинаковый, поэтому новый элемент никогда не раньше текущего ближайшего"""
+    global reject_timer_task
+    heapq.heappush(REJECT_TIMERS, (time.monotonic() + REJECT_TIMEOUT, next(REJECT_TIMER_SEQ), args))
+    if reject_timer_task is None or reject_timer_task.done():
+        reject_timer_task = asyncio.create_task(reject_timer_loop())
 
-@dp.callback_query(F.data.startswith("rej_"))
+@dp.callback_query(F.data.startswith(CB_REJ))
 async def reject(cb: CallbackQuery, state: FSMContext):
-    if not await validate_chat_for_moderation(cb):
+    if not validate_chat_for_moderation(cb):
         return await cb.answer("⚠️ Это действие доступно только в теме модерации", show_alert=True)
     
     try:
-        pid = int(cb.data.split("_")[1])
+        pid = int(cb.data.removeprefix(CB_REJ))
     except ValueError:
         return await cb.answer("Неверный ID поста", show_alert=True)
     
@@ -1909,35 +2436,23 @@ async def reject(cb: CallbackQuery, state: FSMContext):
     elif current_status == "rejected":
         await cb.answer("❌ Этот пост уже отклонен!", show_alert=True)
         return
+    elif not current_status:
+        return await cb.answer("Пост не найден", show_alert=True)
     
     message_id = cb.message.message_id
     chat_id = cb.message.chat.id
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT text, photo FROM posts WHERE id=?",
-            (pid,)
-        )
-        row = await cur.fetchone()
-        if not row:
-            return await cb.answer("Пост не найден", show_alert=True)
-        
-        post_text, photo = row
-        original_text = f"📨 <b>Новый пост #{pid} на модерации</b>\n\n{post_text}"
-    
+    # time.monotonic(): не зависит от перевода системных часов, и его дешевле сравнивать
+    started_at = time.monotonic()
     await state.set_state(RejectState.wait_reason)
     await state.update_data(
         post_id=pid,
         message_id=message_id,
         chat_id=chat_id,
-        original_text=original_text,
-        photo=photo,
-        timestamp=datetime.now()
+        timestamp=started_at
     )
 
-    kb = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="❌ Отмена", callback_data=f"cancel_rej_{pid}")]
-    ])
+    kb = cancel_reject_keyboard(pid)
 
     await bot.send_message(
         chat_id=MODERATORS_CHAT_ID,
@@ -1947,12 +2462,12 @@ async def reject(cb: CallbackQuery, state: FSMContext):
     )
     await cb.answer()
     
-    asyncio.create_task(reject_timeout_handler(state, pid, message_id, chat_id, original_text, photo))
+    schedule_reject_timeout(state, pid, started_at, message_id, chat_id)
 
-@dp.callback_query(F.data.startswith("cancel_rej_"))
+@dp.callback_query(F.data.startswith(CB_CANCEL_REJ))
 async def cancel_rej(cb: CallbackQuery, state: FSMContext):
     try:
-        pid = int(cb.data.split("_")[2])
+        pid = int(cb.data.removeprefix(CB_CANCEL_REJ))
     except ValueError:
         return await cb.answer("❌ Ошибка", show_alert=True)
     
@@ -1962,16 +2477,34 @@ async def cancel_rej(cb: CallbackQuery, state: FSMContext):
     if current_post_id != pid:
         return await cb.answer("❌ Несоответствие ID поста", show_alert=True)
     
-    message_id = data.get("message_id")
-    chat_id = data.get("chat_id")
-    original_text = data.get("original_text")
-    photo = data.get("photo")
-    
     await state.clear()
-    await reset_reject_state(pid, message_id, chat_id, original_text, photo)
+    await reset_reject_state(pid, data.get("message_id"), data.get("chat_id"))
     await cb.answer("❌ Отмена отклонения")
 
-@dp.message(RejectState.wait_reason)
+async def mark_moderation_message_rejected(post_id: int, message_id: int, chat_id: int):
+    try:
+        await bot.edit_message_reply_markup(
+            chat_id=chat_id,
+            message_id=message_id,
+            reply_markup=disabled_moderation_keyboard(post_id, "rejected")
+        )
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            logger.error("Ошибка при обновлении сообщения: %s", e)
+    except Exception as e:
+        logger.error("Ошибка при обновлении сообщения: %s", e)
+
+# Telegram делит длинный вставленный текст на части по ~4096 символов. Если часть причины
+# отказа близка к этому пределу, ждём продолжение и склеиваем части; короткие причины
+# обрабатываются сразу, без задержки.
+REASON_SPLIT_THRESHOLD = 4000
+REASON_COALESCE_DELAY = 2.0
+# Сколько символов причины показывать в сообщениях (в БД сохраняется полный текст)
+REASON_DISPLAY_LIMIT = 3500
+# Ссылки на отложенные задачи склейки, чтобы сборщик мусора не снял их до срабатывания
+REASON_FINISH_TASKS: set = set()
+
+@dp.message(RejectState.wait_reason, F.text)
 async def reject_reason(msg: Message, state: FSMContext):
     data = await state.get_data()
     pid = data.get("post_id")
@@ -1980,81 +2513,70 @@ async def reject_reason(msg: Message, state: FSMContext):
     
     message_id = data.get("message_id")
     chat_id = data.get("chat_id")
-    original_text = data.get("original_text")
-    photo = data.get("photo")
     timestamp = data.get("timestamp")
+    pending_reason = data.get("pending_reason")
     
-    if timestamp and (datetime.now() - timestamp).total_seconds() > 70:
+    # Продолжение уже начатой причины пришло вовремя — срок проверяли по первой части
+    if pending_reason is None and timestamp and time.monotonic() - timestamp > REJECT_REASON_DEADLINE:
         await state.clear()
-        await reset_reject_state(pid, message_id, chat_id, original_text, photo)
-        return await bot.send_message(
-            chat_id=MODERATORS_CHAT_ID,
-            message_thread_id=MODERATORS_TOPIC_ID,
-            text="⚠️ Время на указание причины истекло. Действие отменено."
-        )
+        await reset_reject_state(pid, message_id, chat_id)
+        moderator_notifier.enqueue(f"⚠️ Время на указание причины по посту #{pid} истекло. Действие отменено.")
+        return
     
-    await state.clear()
-
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT user_id FROM posts WHERE id=?",
-            (pid,)
-        )
-        row = await cur.fetchone()
-
-        if not row:
-            return await msg.answer("Пост не найден.")
+    reason = msg.text if pending_reason is None else f"{pending_reason}\n{msg.text}"
+    
+    if len(msg.text) >= REASON_SPLIT_THRESHOLD:
+        part = data.get("pending_part", 0) + 1
+        await state.update_data(pending_reason=reason, pending_part=part)
+        task = asyncio.create_task(finish_reject_after_delay(state, msg, pid, part))
+        REASON_FINISH_TASKS.add(task)
+        task.add_done_callback(REASON_FINISH_TASKS.discard)
+        return
+    
+    await finish_reject(state, msg, pid, message_id, chat_id, reason)
 
-        user_id = row[0]
-        await db.execute(
-            "UPDATE posts SET status='rejected', moderator_id=?, moderation_time=?, reject_reason=? WHERE id=?",
-            (msg.from_user.id, str(datetime.now()), msg.text, pid)
-        )
-        await db.commit()
+@dp.message(RejectState.wait_reason)
+async def reject_reason_not_text(msg: Message):
+    await msg.answer("✍️ Причину отказа нужно отправить текстом.")
 
-        await update_admin_message_status(pid, "rejected", msg.text)
+async def finish_reject_after_delay(state: FSMContext, msg: Message, pid: int, part: int):
+    """Завершает отказ, если за REASON_COALESCE_DELAY не пришло продолжение причины"""
+    await asyncio.sleep(REASON_COALESCE_DELAY)
+    data = await state.get_data()
+    if await state.get_state() != RejectState.wait_reason.state or data.get("post_id") != pid:
+        return await msg.answer(f"⚠️ Причина отказа по посту #{pid} не сохранена: отказ уже отменён или завершён.")
+    # Пришло продолжение — отказ завершит задача последней части
+    if data.get("pending_part") != part:
+        return
+    await finish_reject(
+        state, msg, data.get("post_id"), data.get("message_id"), data.get("chat_id"), data["pending_reason"]
+    )
 
-        try:
-            if photo:
-                await bot.edit_message_caption(
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    caption=original_text,
-                    parse_mode='HTML',
-                    reply_markup=disabled_moderation_keyboard(pid, "rejected")
-                )
-            else:
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=message_id,
-                    text=original_text,
-                    parse_mode='HTML',
-                    reply_markup=disabled_moderation_keyboard(pid, "rejected")
-                )
-        except TelegramBadRequest as e:
-            if "message is not modified" not in str(e):
-                logger.error(f"Ошибка при обновлении сообщения: {e}")
-        except Exception as e:
-            logger.error(f"Ошибка при обновлении сообщения: {e}")
+async def finish_reject(state: FSMContext, msg: Message, pid: int, message_id: int, chat_id: int, reason: str):
+    await state.clear()
 
-    try:
-        await bot.send_message(
-            user_id,
-            f"❌ Ваш пост отклонён.\n\n"
-            f"📝 <b>Причина:</b> {msg.text}\n\n"
-            f"👮 <b>Модератор:</b> @{msg.from_user.username or 'без username'}",
-            parse_mode='HTML'
-        )
-    except Exception as e:
-        logger.warning(f"Не удалось уведомить пользователя {user_id}: {e}")
+    user_id = await claim_post_for_reject(pid, msg.from_user.id, reason)
+    if user_id is None:
+        if await get_post_status(pid):
+            return await msg.answer("❌ Этот пост уже обработан.")
+        return await msg.answer("Пост не найден.")
+
+    shown_reason = reason if len(reason) <= REASON_DISPLAY_LIMIT else reason[:REASON_DISPLAY_LIMIT] + "…"
+    user_notifier.enqueue(
+        user_id,
+        f"❌ Ваш пост отклонён.\n\n"
+        f"📝 <b>Причина:</b> {shown_reason}\n\n"
+        f"👮 <b>Модератор:</b> @{msg.from_user.username or 'без username'}"
+    )
+    # Копия администраторам и карточка модерации независимы — обновляем одновременно
+    await asyncio.gather(
+        update_admin_message_status(pid, "rejected", shown_reason),
+        mark_moderation_message_rejected(pid, message_id, chat_id)
+    )
 
-    await log("reject", str(pid))
+    log("reject", str(pid))
     
-    await bot.send_message(
-        chat_id=MODERATORS_CHAT_ID,
-        message_thread_id=MODERATORS_TOPIC_ID,
-        text="✅ Причина отправлена пользователю."
-    )
+    moderator_notifier.enqueue(f"✅ Причина отказа по посту #{pid} отправлена пользователю.")
 
 @dp.callback_query(F.data == "disabled")
 async def disabled_button_handler(cb: CallbackQuery):
@@ -2063,7 +2585,7 @@ async def disabled_button_handler(cb: CallbackQuery):
 # ================== RULES ==================
 @dp.callback_query(F.data == "rules")
 async def rules(cb: CallbackQuery):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
     
     await cb.message.edit_text(
@@ -2075,7 +2597,6 @@ async def rules(cb: CallbackQuery):
         "5. Не публикуются посты в которых упоминается о вредоносных веществах\n"
         "6. Не публикуются посты с упоминанием питбайкеров\n\n"
         "⚠️ Перед пользованием нашим ботом ознакомьтесь также с юридическим уведомление:",
-        parse_mode='HTML',
         reply_markup=rules_keyboard()
     )
 
@@ -2087,44 +2608,51 @@ async def menu(cb: CallbackQuery, state: FSMContext):
         "🏠 Вы в главном меню \n\n"
         "Бот от @maslyanino, ты сегодня прекрасно выглядишь 😘\n\n"
         "Выбери действие: 👇",
-        parse_mode='HTML',
         reply_markup=main_menu()
     )
 
 # ================== PROFILE ==================
+PROFILE_TEXT_FMT = (
+    "👤 <b>Профиль</b>\n\n"
+    "🆔 <b>ID:</b> <code>{user_id}</code>\n"
+    "📛 <b>Юзернейм:</b> @{username}\n"
+    "📊 <b>Статистика:</b>\n"
+    "• Постов за день: {today}/5\n"
+    "• Постов за неделю: {week}\n\n"
+    "📅 <b>Дата регистрации:</b> {reg}\n"
+    "🕵 <b>Разработчик: @theaugustine</b>"
+)
+
 @dp.callback_query(F.data == "profile")
 async def profile(cb: CallbackQuery):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
     
-    today = await posts_today(cb.from_user.id)
+    today = posts_today(cb.from_user.id)
     week = await posts_week(cb.from_user.id)
 
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
+    async with db_readers.acquire() as conn:
+        async with conn.execute(
             "SELECT reg_date, is_subscribed FROM users WHERE user_id=?",
             (cb.from_user.id,)
-        )
-        row = await cur.fetchone()
-        reg = row[0] if row else "Неизвестно"
-        is_subscribed = row[1] if row and row[1] == 1 else 0
-
-    text = (
-        f"👤 <b>Профиль</b>\n\n"
-        f"🆔 <b>ID:</b> <code>{cb.from_user.id}</code>\n"
-        f"📛 <b>Юзернейм:</b> @{cb.from_user.username or 'не установлен'}\n"
-        f"📊 <b>Статистика:</b>\n"
-        f"• Постов за день: {today}/5\n"
-        f"• Постов за неделю: {week}\n\n"
-        f"📅 <b>Дата регистрации:</b> {reg}\n"
-        f"🕵 <b>Разработчик: @theaugustine</b>"
+        ) as cur:
+            row = await cur.fetchone()
+    reg = row[0] if row else "Неизвестно"
+    is_subscribed = row[1] if row and row[1] == 1 else 0
+
+    text = PROFILE_TEXT_FMT.format(
+        user_id=cb.from_user.id,
+        username=cb.from_user.username or 'не установлен',
+        today=today,
+        week=week,
+        reg=reg
     )
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=menu_btn())
+    await cb.message.edit_text(text, reply_markup=menu_btn())
 
 # ================== FAQ / ADS ==================
 @dp.callback_query(F.data == "faq")
 async def faq(cb: CallbackQuery):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
     
     await cb.message.edit_text(
@@ -2139,13 +2667,12 @@ async def faq(cb: CallbackQuery):
         "Нажмите кнопку 'Удалить запись' ниже 👇\n\n"
         "<b>- Как связаться с администрация?</b>\n"
         "Нажмите кнопку 'Администрация' ниже 👇",
-        parse_mode='HTML',
         reply_markup=faq_keyboard()
     )
 
 @dp.callback_query(F.data == "ads")
 async def ads(cb: CallbackQuery):
-    if await is_banned(cb.from_user.id):
+    if is_banned(cb.from_user.id):
         return await cb.answer("🚫 Вы заблокированы.", show_alert=True)
     
     kb = ads_keyboard()
@@ -2161,158 +2688,126 @@ async def ads(cb: CallbackQuery):
         "• 48 часа + 299 руб к стоимости\n"
         "• 72 часа + 399 руб к стоимости\n\n"
         "Остальные услуги находятся в прайс-листе 📩",
-        parse_mode='HTML',
         reply_markup=kb
     )
 
 # ================== COMMANDS FOR ADMINS ==================
-@dp.message(F.text.startswith("/ban"))
-async def ban_command(msg: Message):
-    if msg.from_user.id not in ADMINS:
-        return
-    
-    parts = msg.text.split(maxsplit=2)
-    if len(parts) < 2:
+# Command() сравнивает команду целиком: «/banned» или «/bank» сюда не попадут
+@admin_router.message(Command("ban"))
+async def ban_command(msg: Message, command: CommandObject):
+    parts = (command.args or "").split(maxsplit=1)
+    if not parts:
         return await msg.answer(
             "❌ <b>Использование:</b> <code>/ban &lt;user_id&gt; [причина]</code>\n\n"
             "<i>Примеры:</i>\n"
             "<code>/ban 123456789 спам</code>\n"
-            "<code>/ban 123456789 нарушение правил</code>",
-            parse_mode='HTML'
+            "<code>/ban 123456789 нарушение правил</code>"
         )
     
     try:
-        user_id = int(parts[1])
-        reason = parts[2] if len(parts) > 2 else "Нарушение правил"
+        user_id = int(parts[0])
+        reason = parts[1] if len(parts) > 1 else "Нарушение правил"
         
-        async with aiosqlite.connect(DB_NAME) as db:
-            cur = await db.execute("SELECT 1 FROM users WHERE user_id=?", (user_id,))
-            user_exists = await cur.fetchone() is not None
+        user_exists = await db_readers.fetchone(SQL_USER_EXISTS, (user_id,)) is not None
         
         if not user_exists:
-            return await msg.answer(f"❌ Пользователь с ID <code>{user_id}</code> не найден в базе.", parse_mode='HTML')
+            return await msg.answer(f"❌ Пользователь с ID <code>{user_id}</code> не найден в базе.")
         
         await ban_user(user_id, reason, msg.from_user)
         
-        try:
-            await bot.send_message(
-                user_id,
-                f"🚫 <b>Вы были заблокированы!</b>\n\n"
-                f"📝 <b>Причина:</b> {reason}\n"
-                f"👮 <b>Администратор:</b> @{msg.from_user.username or 'без username'}\n"
-                f"🆔 <b>ID администратора:</b> {msg.from_user.id}\n\n"
-                f"🔒 <b>Вы больше не можете использовать меню бота</b>\n\n"
-                f"📞 <b>Для разблокировки:</b> Свяжитесь с @theaugustine",
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось уведомить пользователя {user_id} о блокировке: {e}")
+        user_notifier.enqueue(
+            user_id,
+            f"🚫 <b>Вы были заблокированы!</b>\n\n"
+            f"📝 <b>Причина:</b> {reason}\n"
+            f"👮 <b>Администратор:</b> @{msg.from_user.username or 'без username'}\n"
+            f"🆔 <b>ID администратора:</b> {msg.from_user.id}\n\n"
+            f"🔒 <b>Вы больше не можете использовать меню бота</b>\n\n"
+            f"📞 <b>Для разблокировки:</b> Свяжитесь с @theaugustine"
+        )
         
         await msg.answer(
             f"✅ Пользователь <code>{user_id}</code> заблокирован.\n"
-            f"📝 <b>Причина:</b> {reason}",
-            parse_mode='HTML'
+            f"📝 <b>Причина:</b> {reason}"
         )
         
     except ValueError:
         await msg.answer("❌ Неверный формат ID пользователя. ID должен быть числом.")
 
-@dp.message(F.text.startswith("/unban"))
-async def unban_command(msg: Message):
-    if msg.from_user.id not in ADMINS:
-        return
-    
-    parts = msg.text.split()
-    if len(parts) < 2:
+@admin_router.message(Command("unban"))
+async def unban_command(msg: Message, command: CommandObject):
+    parts = (command.args or "").split()
+    if not parts:
         return await msg.answer(
             "❌ <b>Использование:</b> <code>/unban &lt;user_id&gt;</code>\n\n"
             "<i>Пример:</i>\n"
-            "<code>/unban 123456789</code>",
-            parse_mode='HTML'
+            "<code>/unban 123456789</code>"
         )
     
     try:
-        user_id = int(parts[1])
+        user_id = int(parts[0])
         
-        if not await is_banned(user_id):
-            return await msg.answer(f"❌ Пользователь <code>{user_id}</code> не заблокирован.", parse_mode='HTML')
+        if not is_banned(user_id):
+            return await msg.answer(f"❌ Пользователь <code>{user_id}</code> не заблокирован.")
         
         await unban_user(user_id)
         
-        try:
-            await bot.send_message(
-                user_id,
-                "✅ <b>Вы были разблокированы!</b>\n\n"
-                "🔓 Теперь вы снова можете использовать бота.\n"
-                f"👮 <b>Администратор:</b> @{msg.from_user.username or 'без username'}\n",
-                parse_mode='HTML'
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось уведомить пользователя {user_id} о разблокировке: {e}")
+        user_notifier.enqueue(
+            user_id,
+            "✅ <b>Вы были разблокированы!</b>\n\n"
+            "🔓 Теперь вы снова можете использовать бота.\n"
+            f"👮 <b>Администратор:</b> @{msg.from_user.username or 'без username'}\n"
+        )
         
-        await msg.answer(f"✅ Пользователь <code>{user_id}</code> разблокирован.", parse_mode='HTML')
+        await msg.answer(f"✅ Пользователь <code>{user_id}</code> разблокирован.")
         
     except ValueError:
         await msg.answer("❌ Неверный формат ID пользователя. ID должен быть числом.")
 
 # ================== ADMIN PANEL ==================
+@admin_denied_router.callback_query(F.data.in_(ADMIN_CALLBACKS) | F.data.startswith(ADMIN_CALLBACK_PREFIXES))
+async def admin_access_denied(cb: CallbackQuery):
+    await cb.answer("🚫 У вас нет доступа.", show_alert=True)
+
+ADMIN_PANEL_TEXT_FMT = (
+    "🛠 <b>Админ-панель</b>\n\n"
+    "📊 <b>Статистика:</b>\n"
+    "👥 Пользователей: <b>{users_count}</b>\n"
+    "🚫 Заблокировано: <b>{banned_count}</b>\n"
+    "📝 Слов в ЧС публикаций: <b>{blacklist_count}</b>\n"
+    "📢 Обязательных подписок: <b>{subscription_count}</b>\n\n"
+    "<i>Выберите действие:</i>"
+)
+
+def render_admin_panel() -> str:
+    """Текст главного экрана админ-панели (общий для /admin и кнопки «назад»)"""
+    return ADMIN_PANEL_TEXT_FMT.format(
+        users_count=USERS_COUNT,
+        banned_count=len(BANNED_USERS),
+        blacklist_count=len(BLACKLIST_KEYWORDS),
+        subscription_count=len(REQUIRED_SUBSCRIPTIONS),
+    )
+
 @dp.message(F.text == "/admin")
 async def admin_panel_command(msg: Message):
-    if msg.from_user.id not in ADMINS:
+    if msg.from_user.id not in ADMINS_SET:
         return await msg.answer("🚫 У вас нет доступа к этой команде.")
     
-    users_count = await get_users_count()
-    banned_users, _ = await get_banned_users(page=1, per_page=1)
-    banned_count = len(banned_users) if banned_users else 0
-    blacklist, _ = await get_publication_blacklist(page=1, per_page=100)
-    blacklist_count = len(blacklist) if blacklist else 0
-    subscription_count = len(REQUIRED_SUBSCRIPTIONS)
-    
-    text = (
-        f"🛠 <b>Админ-панель</b>\n\n"
-        f"📊 <b>Статистика:</b>\n"
-        f"👥 Пользователей: <b>{users_count}</b>\n"
-        f"🚫 Заблокировано: <b>{banned_count}</b>\n"
-        f"📝 Слов в ЧС публикаций: <b>{blacklist_count}</b>\n"
-        f"📢 Обязательных подписок: <b>{subscription_count}</b>\n\n"
-        f"<i>Выберите действие:</i>"
-    )
-    
-    await msg.answer(text, parse_mode='HTML', reply_markup=admin_menu())
+    await msg.answer(render_admin_panel(), reply_markup=admin_menu())
 
-@dp.callback_query(F.data == "admin_panel")
+@admin_router.callback_query(F.data == "admin_panel")
 async def admin_panel_callback(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
-    users_count = await get_users_count()
-    banned_users, _ = await get_banned_users(page=1, per_page=1)
-    banned_count = len(banned_users) if banned_users else 0
-    blacklist, _ = await get_publication_blacklist(page=1, per_page=100)
-    blacklist_count = len(blacklist) if blacklist else 0
-    subscription_count = len(REQUIRED_SUBSCRIPTIONS)
-    
-    text = (
-        f"🛠 <b>Админ-панель</b>\n\n"
-        f"📊 <b>Статистика:</b>\n"
-        f"👥 Пользователей: <b>{users_count}</b>\n"
-        f"🚫 Заблокировано: <b>{banned_count}</b>\n"
-        f"📝 Слов в ЧС публикаций: <b>{blacklist_count}</b>\n"
-        f"📢 Обязательных подписок: <b>{subscription_count}</b>\n\n"
-        f"<i>Выберите действие:</i>"
-    )
-    
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=admin_menu())
+    # Повторное нажатие, когда панель уже на экране, — не ошибка: просто гасим «загрузку» кнопки
+    try:
+        await cb.message.edit_text(render_admin_panel(), reply_markup=admin_menu())
+    except TelegramBadRequest as e:
+        if "message is not modified" not in str(e):
+            raise
+    await cb.answer()
 
-@dp.callback_query(F.data == "blacklist")
+@admin_router.callback_query(F.data == "blacklist")
 async def blacklist_panel(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
-    banned_users, _ = await get_banned_users(page=1, per_page=1)
-    banned_count = len(banned_users) if banned_users else 0
-    blacklist, _ = await get_publication_blacklist(page=1, per_page=1)
-    blacklist_count = len(blacklist) if blacklist else 0
+    banned_count = len(BANNED_USERS)
+    blacklist_count = len(BLACKLIST_KEYWORDS)
     
     text = (
         f"🚫 <b>Управление черными списками</b>\n\n"
@@ -2322,71 +2817,77 @@ async def blacklist_panel(cb: CallbackQuery):
         f"<i>Выберите действие:</i>"
     )
     
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=blacklist_menu())
+    await cb.message.edit_text(text, reply_markup=blacklist_menu())
 
 # ================== ЗАБЛОКИРОВАННЫЕ ПОЛЬЗОВАТЕЛИ ==================
-@dp.callback_query(F.data == "banned_users")
+@admin_router.callback_query(F.data == "banned_users")
 async def show_banned_users(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await show_banned_users_page(cb, page=1)
 
+BANNED_ROW_FMT = (
+    "<b>{i}. 🆔 <code>{user_id}</code></b>\n"
+    "   📛 @{username}\n"
+    "   📝 <b>Причина:</b> {reason}\n"
+    "{admin_line}"
+    "   🕐 <b>Заблокирован:</b> {time}\n"
+)
+
 async def show_banned_users_page(cb: CallbackQuery, page: int):
     banned_users, total = await get_banned_users(page=page, per_page=5)
     total_pages = (total + 4) // 5
     
     if not banned_users:
         text = "👤 <b>Нет заблокированных пользователей</b>"
-        await cb.message.edit_text(text, parse_mode='HTML', reply_markup=blacklist_menu())
+        await cb.message.edit_text(text, reply_markup=blacklist_menu())
         return
     
-    text_lines = [f"🚫 <b>Заблокированные пользователи (стр. {page}/{total_pages}):</b>\n\n"]
-    
     start_idx = (page - 1) * 5 + 1
-    for i, (user_id, reason, ban_time, admin_username, username) in enumerate(banned_users, start_idx):
-        try:
-            time_str = datetime.fromisoformat(ban_time).strftime('%d.%m.%Y %H:%M')
-        except:
-            time_str = ban_time
-        
-        text_lines.append(f"<b>{i}. 🆔 <code>{user_id}</code></b>")
-        text_lines.append(f"   📛 @{username or 'без username'}")
-        text_lines.append(f"   📝 <b>Причина:</b> {reason}")
-        if admin_username:
-            text_lines.append(f"   👮 <b>Админ:</b> @{admin_username}")
-        text_lines.append(f"   🕐 <b>Заблокирован:</b> {time_str}\n")
-    
-    text = "\n".join(text_lines)
+    text = f"🚫 <b>Заблокированные пользователи (стр. {page}/{total_pages}):</b>\n\n\n" + "\n".join(
+        BANNED_ROW_FMT.format(
+            i=i,
+            user_id=user_id,
+            username=username or 'без username',
+            reason=reason,
+            admin_line=f"   👮 <b>Админ:</b> @{admin_username}\n" if admin_username else "",
+            time=format_db_time(ban_time, '%d.%m.%Y %H:%M'),
+        )
+        for i, (user_id, reason, ban_time, admin_username, username) in enumerate(banned_users, start_idx)
+    )
     
     if len(text) > 4000:
         text = text[:4000] + "\n\n... (список слишком длинный)"
     
     await cb.message.edit_text(
         text, 
-        parse_mode='HTML', 
         reply_markup=pagination_keyboard(page, total_pages, "banned", "blacklist")
     )
 
-@dp.callback_query(F.data.startswith("banned_page_"))
+@admin_router.callback_query(F.data.startswith(CB_BANNED_PAGE))
 async def banned_page_handler(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        page = int(cb.data.split("_")[2])
+        page = int(cb.data.removeprefix(CB_BANNED_PAGE))
         await show_banned_users_page(cb, page)
     except (ValueError, IndexError):
         await cb.answer("❌ Ошибка при загрузке страницы", show_alert=True)
 
 # ================== ЧЕРНЫЙ СПИСОК ПУБЛИКАЦИЙ ==================
-@dp.callback_query(F.data == "pub_blacklist")
+@admin_router.callback_query(F.data == "pub_blacklist")
 async def show_pub_blacklist(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await show_pub_blacklist_page(cb, page=1)
 
+PUB_BLACKLIST_ROW_FMT = (
+    "<b>{i}. 🔤 <code>{keyword}</code></b>\n"
+    "   👤 Добавил: {admin_info}\n"
+    "   🕐 Время: {time}\n"
+)
+
+def blacklist_admin_info(added_by: Optional[int], admin_username: Optional[str]) -> str:
+    if admin_username:
+        return f"@{admin_username}"
+    if added_by:
+        return f"<code>{added_by}</code>"
+    return "неизвестно"
+
 async def show_pub_blacklist_page(cb: CallbackQuery, page: int):
     """Показать страницу черного списка публикаций"""
     blacklist, total = await get_publication_blacklist(page=page, per_page=5)
@@ -2394,65 +2895,39 @@ async def show_pub_blacklist_page(cb: CallbackQuery, page: int):
     
     if not blacklist:
         text = "📝 <b>Черный список публикаций пуст</b>"
-        await cb.message.edit_text(text, parse_mode='HTML', reply_markup=blacklist_menu())
+        await cb.message.edit_text(text, reply_markup=blacklist_menu())
         return
     
-    text_lines = [f"📋 <b>Черный список публикаций (стр. {page}/{total_pages}):</b>\n\n"]
-    
     start_idx = (page - 1) * 5 + 1
-    for i, (keyword, added_by, added_time) in enumerate(blacklist, start_idx):
-        try:
-            time_str = datetime.fromisoformat(added_time).strftime('%d.%m.%Y %H:%M')
-        except:
-            time_str = added_time or "неизвестно"
-        
-        admin_info = ""
-        if added_by:
-            try:
-                async with aiosqlite.connect(DB_NAME) as db:
-                    cur = await db.execute("SELECT username FROM users WHERE user_id=?", (added_by,))
-                    admin_row = await cur.fetchone()
-                    if admin_row and admin_row[0]:
-                        admin_info = f"@{admin_row[0]}"
-                    else:
-                        admin_info = f"<code>{added_by}</code>"
-            except:
-                admin_info = f"<code>{added_by}</code>"
-        else:
-            admin_info = "неизвестно"
-        
-        text_lines.append(f"<b>{i}. 🔤 <code>{keyword}</code></b>")
-        text_lines.append(f"   👤 Добавил: {admin_info}")
-        text_lines.append(f"   🕐 Время: {time_str}\n")
-    
-    text = "\n".join(text_lines)
+    text = f"📋 <b>Черный список публикаций (стр. {page}/{total_pages}):</b>\n\n\n" + "\n".join(
+        PUB_BLACKLIST_ROW_FMT.format(
+            i=i,
+            keyword=keyword,
+            admin_info=blacklist_admin_info(added_by, admin_username),
+            time=format_db_time(added_time, '%d.%m.%Y %H:%M') or "неизвестно",
+        )
+        for i, (keyword, added_by, added_time, admin_username) in enumerate(blacklist, start_idx)
+    )
     
     if len(text) > 4000:
         text = text[:4000] + "\n\n... (список слишком длинный)"
     
     await cb.message.edit_text(
         text, 
-        parse_mode='HTML', 
         reply_markup=pub_blacklist_menu(page, total_pages)
     )
 
-@dp.callback_query(F.data.startswith("pubblack_page_"))
+@admin_router.callback_query(F.data.startswith(CB_PUBBLACK_PAGE))
 async def pubblack_page_handler(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        page = int(cb.data.split("_")[2])
+        page = int(cb.data.removeprefix(CB_PUBBLACK_PAGE))
         await show_pub_blacklist_page(cb, page)
     except (ValueError, IndexError):
         await cb.answer("❌ Ошибка при загрузке страницы", show_alert=True)
 
 # ================== ДОБАВЛЕНИЕ В ЧЕРНЫЙ СПИСОК ==================
-@dp.callback_query(F.data == "add_pub_blacklist")
+@admin_router.callback_query(F.data == "add_pub_blacklist")
 async def add_pub_blacklist(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(BlacklistState.wait_keyword)
     await cb.message.edit_text(
         "📝 <b>Добавление слова в черный список публикаций</b>\n\n"
@@ -2462,15 +2937,11 @@ async def add_pub_blacklist(cb: CallbackQuery, state: FSMContext):
         "• плохое слово - для блокировки конкретного слова\n"
         "• запрещенная фраза - для блокировки конкретной фразы\n\n"
         "⚠️ <b>Внимание:</b> Регистр не учитывается.",
-        parse_mode='HTML',
         reply_markup=blacklist_cancel_menu()
     )
 
-@dp.message(BlacklistState.wait_keyword)
+@admin_router.message(BlacklistState.wait_keyword)
 async def process_pub_blacklist_keyword(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     keyword = msg.text.strip()
     if len(keyword) < 2:
         await msg.answer("❌ Ключевое слово должно содержать минимум 2 символа.")
@@ -2482,36 +2953,34 @@ async def process_pub_blacklist_keyword(msg: Message, state: FSMContext):
         await msg.answer(
             f"✅ Добавлено в черный список публикаций: <code>{keyword}</code>\n\n"
             f"📝 Теперь посты, содержащие это слово/фразу, будут автоматически отклоняться.",
-            parse_mode='HTML',
             reply_markup=blacklist_menu()
         )
-        await log("blacklist_add", f"admin {msg.from_user.id} added '{keyword}'")
+        log("blacklist_add", f"admin {msg.from_user.id} added '{keyword}'")
     else:
         await msg.answer(
             f"❌ Ключевое слово <code>{keyword}</code> уже есть в черном списке.",
-            parse_mode='HTML',
             reply_markup=blacklist_menu()
         )
     
     await state.clear()
 
 # ================== УДАЛЕНИЕ ИЗ ЧЕРНОГО СПИСКА ==================
-@dp.callback_query(F.data == "remove_pub_blacklist")
+BLACKLIST_REMOVE_KB_LIMIT = 100
+
+@admin_router.callback_query(F.data == "remove_pub_blacklist")
 async def remove_pub_blacklist(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
+    # Для кнопок нужны только сами слова: берём первые по алфавиту из памяти, без запроса к БД
+    keywords = heapq.nsmallest(BLACKLIST_REMOVE_KB_LIMIT, BLACKLIST_KEYWORDS)
     
-    blacklist, total = await get_publication_blacklist(page=1, per_page=100)
-    
-    if not blacklist:
+    if not keywords:
         return await cb.answer("📋 Черный список публикаций пуст.", show_alert=True)
     
     keyboard = []
-    for i, (keyword, added_by, added_time) in enumerate(blacklist, 1):
+    for i, keyword in enumerate(keywords, 1):
         keyboard.append([
             InlineKeyboardButton(
                 text=f"{i}. {keyword}",
-                callback_data=f"remove_blacklist_word_{keyword}"
+                callback_data=f"{CB_REMOVE_BLACKLIST_WORD}{keyword}"
             )
         ])
     
@@ -2520,16 +2989,12 @@ async def remove_pub_blacklist(cb: CallbackQuery, state: FSMContext):
     await cb.message.edit_text(
         "🗑️ <b>Удаление слова из черного списка публикаций</b>\n\n"
         "Выберите слово для удаления:",
-        parse_mode='HTML',
         reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
     )
 
-@dp.callback_query(F.data.startswith("remove_blacklist_word_"))
+@admin_router.callback_query(F.data.startswith(CB_REMOVE_BLACKLIST_WORD))
 async def process_remove_blacklist_word(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
-    keyword = cb.data.replace("remove_blacklist_word_", "")
+    keyword = cb.data.removeprefix(CB_REMOVE_BLACKLIST_WORD)
     
     await remove_from_publication_blacklist(keyword)
     
@@ -2538,37 +3003,20 @@ async def process_remove_blacklist_word(cb: CallbackQuery):
     await show_pub_blacklist_page(cb, page=1)
 
 # ================== АДМИНСКАЯ СТАТИСТИКА ==================
-@dp.callback_query(F.data == "admin_stats")
+@admin_router.callback_query(F.data == "admin_stats")
 async def admin_stats(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
-    users_count = await get_users_count()
-    banned_users, _ = await get_banned_users(page=1, per_page=1)
-    banned_count = len(banned_users) if banned_users else 0
-    blacklist, _ = await get_publication_blacklist(page=1, per_page=100)
-    blacklist_count = len(blacklist) if blacklist else 0
+    banned_count = len(BANNED_USERS)
+    blacklist_count = len(BLACKLIST_KEYWORDS)
     subscription_count = len(REQUIRED_SUBSCRIPTIONS)
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute("SELECT COUNT(*) FROM posts")
-        total_posts = (await cur.fetchone())[0]
-        
-        cur = await db.execute("SELECT COUNT(*) FROM posts WHERE status='published'")
-        published_posts = (await cur.fetchone())[0]
-        
-        cur = await db.execute("SELECT COUNT(*) FROM posts WHERE status='moderation'")
-        pending_posts = (await cur.fetchone())[0]
-        
-        cur = await db.execute("SELECT COUNT(*) FROM posts WHERE status='rejected'")
-        rejected_posts = (await cur.fetchone())[0]
-        
-        today = str(datetime.now().date())
-        cur = await db.execute("SELECT COUNT(*) FROM posts WHERE date(time)=?", (today,))
-        today_posts = (await cur.fetchone())[0]
-        
-        cur = await db.execute("SELECT COUNT(*) FROM users WHERE date(reg_date)=?", (today,))
-        today_users = (await cur.fetchone())[0]
+    today_bounds = day_bounds(date.today())
+    # Запросы к posts и users независимы — выполняются параллельно на двух соединениях пула
+    posts_row, users_row = await asyncio.gather(
+        db_readers.fetchone(SQL_POSTS_STATS, today_bounds),
+        db_readers.fetchone(SQL_USERS_STATS, today_bounds),
+    )
+    total_posts, published_posts, pending_posts, rejected_posts, today_posts = posts_row
+    users_count, today_users = users_row
     
     text = (
         f"📊 <b>Статистика бота</b>\n\n"
@@ -2588,116 +3036,140 @@ async def admin_stats(cb: CallbackQuery):
         f"{datetime.now().strftime('%d.%m.%Y %H:%M:%S')}"
     )
     
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=admin_menu())
+    await cb.message.edit_text(text, reply_markup=admin_menu())
 
 # ================== ЛОГИ ==================
-@dp.callback_query(F.data == "admin_logs")
+LOGS_PER_PAGE = 20
+# Страницы логов отсчитываются от ID крайней записи (id — это rowid), а не через OFFSET:
+# стоимость страницы не растёт с её номером
+SQL_LOGS_LATEST = "SELECT id,action,data,time FROM logs ORDER BY id DESC LIMIT ?"
+SQL_LOGS_OLDER = "SELECT id,action,data,time FROM logs WHERE id<? ORDER BY id DESC LIMIT ?"
+SQL_LOGS_NEWER = "SELECT id,action,data,time FROM logs WHERE id>? ORDER BY id LIMIT ?"
+
+@admin_router.callback_query(F.data == "admin_logs")
 async def show_admin_logs(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
+    await show_admin_logs_page(cb, page=1)
+
+async def show_admin_logs_page(cb: CallbackQuery, page: int,
+                               older_than: Optional[int] = None, newer_than: Optional[int] = None):
+    # Одна лишняя строка показывает, есть ли записи дальше, без COUNT(*) по всей таблице логов
+    limit = LOGS_PER_PAGE + 1
+    async with db_readers.acquire() as conn:
+        if newer_than is not None:
+            rows = await conn.execute_fetchall(SQL_LOGS_NEWER, (newer_than, limit))
+        elif older_than is not None:
+            rows = await conn.execute_fetchall(SQL_LOGS_OLDER, (older_than, limit))
+        else:
+            rows = await conn.execute_fetchall(SQL_LOGS_LATEST, (limit,))
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        cur = await db.execute(
-            "SELECT action,data,time FROM logs ORDER BY id DESC LIMIT 20"
-        )
-        rows = await cur.fetchall()
+    if newer_than is not None:
+        has_newer = len(rows) > LOGS_PER_PAGE
+        has_older = True
+        rows = rows[:LOGS_PER_PAGE][::-1]
+    else:
+        has_newer = older_than is not None
+        has_older = len(rows) > LOGS_PER_PAGE
+        rows = rows[:LOGS_PER_PAGE]
 
     if not rows:
         text = "📋 <b>Логи пока отсутствуют</b>"
-    else:
-        text_lines = ["📋 <b>Последние 20 логов:</b>\n"]
-        for action, data, time in rows:
-            try:
-                log_time = datetime.fromisoformat(time)
-                formatted_time = log_time.strftime('%H:%M:%S')
-            except:
-                formatted_time = time
-            
-            text_lines.append(f"🕐 {formatted_time} | {action} | {data}")
-        
-        text = "\n".join(text_lines)
-        if len(text) > 4000:
-            text = text[:4000] + "..."
+        await cb.message.edit_text(text, reply_markup=admin_menu())
+        return
     
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=admin_menu())
+    text = f"📋 <b>Логи (стр. {page}):</b>\n\n" + "\n".join(
+        f"🕐 {format_db_time(log_time, '%H:%M:%S')} | {action} | {data}"
+        for _, action, data, log_time in rows
+    )
+    if len(text) > 4000:
+        text = text[:4000] + "..."
+    
+    await cb.message.edit_text(
+        text,
+        reply_markup=logs_keyboard(page, rows[0][0], rows[-1][0], has_newer, has_older)
+    )
+
+@admin_router.callback_query(F.data.startswith(CB_LOGS_OLDER))
+async def logs_older_handler(cb: CallbackQuery):
+    try:
+        page, log_id = map(int, cb.data.removeprefix(CB_LOGS_OLDER).split("_"))
+        await show_admin_logs_page(cb, page, older_than=log_id)
+    except ValueError:
+        await cb.answer("❌ Ошибка при загрузке страницы", show_alert=True)
+
+@admin_router.callback_query(F.data.startswith(CB_LOGS_NEWER))
+async def logs_newer_handler(cb: CallbackQuery):
+    try:
+        page, log_id = map(int, cb.data.removeprefix(CB_LOGS_NEWER).split("_"))
+        # Первая страница всегда показывает самые свежие записи, включая появившиеся после открытия
+        if page <= 1:
+            await show_admin_logs_page(cb, page=1)
+        else:
+            await show_admin_logs_page(cb, page, newer_than=log_id)
+    except ValueError:
+        await cb.answer("❌ Ошибка при загрузке страницы", show_alert=True)
 
 # ================== ПОСТЫ НА МОДЕРАЦИИ ==================
-@dp.callback_query(F.data == "pending_posts")
+@admin_router.callback_query(F.data == "pending_posts")
 async def show_pending_posts(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await show_pending_posts_page(cb, page=1)
 
+PENDING_ROW_FMT = (
+    "<b>{i}. 📌 Пост #{post_id}</b>\n"
+    "   👤 Автор: <code>{user_id}</code>\n"
+    "   🕐 {time}\n"
+    "   📄 {preview}\n"
+    "   {photo}\n"
+)
+
 async def show_pending_posts_page(cb: CallbackQuery, page: int):
     posts, total = await get_pending_posts(page=page, per_page=5)
     total_pages = (total + 4) // 5
     
     if not posts:
         text = "📭 <b>Постов на модерации нет</b>"
-        await cb.message.edit_text(text, parse_mode='HTML', reply_markup=admin_menu())
+        await cb.message.edit_text(text, reply_markup=admin_menu())
         return
     
-    text_lines = [f"📨 <b>Посты на модерации (стр. {page}/{total_pages}):</b>\n\n"]
-    
     start_idx = (page - 1) * 5 + 1
-    for post_id, user_id, post_text, time, photo in posts:
-        preview = post_text[:50] + "..." if len(post_text) > 50 else post_text
-        
-        try:
-            post_time = datetime.fromisoformat(time)
-            formatted_time = post_time.strftime('%d.%m.%Y %H:%M')
-        except:
-            formatted_time = time
-        
-        text_lines.append(f"<b>{start_idx}. 📌 Пост #{post_id}</b>")
-        text_lines.append(f"   👤 Автор: <code>{user_id}</code>")
-        text_lines.append(f"   🕐 {formatted_time}")
-        text_lines.append(f"   📄 {preview}")
-        text_lines.append(f"   {'📷 С фото' if photo else '📝 Без фото'}")
-        text_lines.append("")
-        start_idx += 1
-    
-    text = "\n".join(text_lines)
+    text = f"📨 <b>Посты на модерации (стр. {page}/{total_pages}):</b>\n\n\n" + "\n".join(
+        PENDING_ROW_FMT.format(
+            i=i,
+            post_id=post_id,
+            user_id=user_id,
+            time=format_db_time(post_time, '%d.%m.%Y %H:%M'),
+            preview=post_text[:50] + "..." if len(post_text) > 50 else post_text,
+            photo='📷 С фото' if has_photo else '📝 Без фото',
+        )
+        for i, (post_id, user_id, post_text, post_time, has_photo) in enumerate(posts, start_idx)
+    )
     
     await cb.message.edit_text(
         text, 
-        parse_mode='HTML', 
         reply_markup=pending_posts_keyboard(page, total_pages)
     )
 
-@dp.callback_query(F.data.startswith("pending_page_"))
+@admin_router.callback_query(F.data.startswith(CB_PENDING_PAGE))
 async def pending_page_handler(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        page = int(cb.data.split("_")[2])
+        page = int(cb.data.removeprefix(CB_PENDING_PAGE))
         await show_pending_posts_page(cb, page)
     except (ValueError, IndexError):
         await cb.answer("❌ Ошибка при загрузке страницы", show_alert=True)
 
 # ================== АДМИНСКАЯ ПУБЛИКАЦИЯ ПОСТА ==================
-@dp.callback_query(F.data == "admin_publish_post")
+@admin_router.callback_query(F.data == "admin_publish_post")
 async def admin_publish_post(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(AdminPostState.wait_post_id_for_publish)
     await cb.message.edit_text(
         "📝 <b>Публикация поста</b>\n\n"
         "Введите номер поста, который хотите опубликовать:",
-        parse_mode='HTML',
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="⬅️ Назад", callback_data="pending_posts")]
         ])
     )
 
-@dp.message(AdminPostState.wait_post_id_for_publish)
+@admin_router.message(AdminPostState.wait_post_id_for_publish)
 async def process_admin_publish_post_id(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     try:
         post_id = int(msg.text.strip())
     except ValueError:
@@ -2734,29 +3206,24 @@ async def process_admin_publish_post_id(msg: Message, state: FSMContext):
         await msg.answer_photo(
             photo=post[3],
             caption=preview_text,
-            parse_mode='HTML',
             reply_markup=admin_post_confirm_keyboard(post_id, "publish")
         )
     else:
         await msg.answer(
             preview_text,
-            parse_mode='HTML',
             reply_markup=admin_post_confirm_keyboard(post_id, "publish")
         )
 
-@dp.callback_query(F.data.startswith("admin_publish_confirm_"))
+@admin_router.callback_query(F.data.startswith(CB_ADMIN_PUBLISH_CONFIRM))
 async def admin_publish_confirm(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        post_id = int(cb.data.split("_")[3])
+        post_id = int(cb.data.removeprefix(CB_ADMIN_PUBLISH_CONFIRM))
     except (ValueError, IndexError):
         return await cb.answer("❌ Неверный ID поста", show_alert=True)
     
-    post = await get_post_by_id(post_id)
+    row = await claim_post_for_publish(post_id, cb.from_user.id)
     
-    if not post or post[5] != "moderation":
+    if not row:
         await state.clear()
         return await cb.message.edit_text(
             "❌ Пост уже был обработан другим администратором.",
@@ -2765,35 +3232,22 @@ async def admin_publish_confirm(cb: CallbackQuery, state: FSMContext):
             ])
         )
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        text, photo, user_id = post[2], post[3], post[1]
-        
-        try:
-            if photo:
-                await bot.send_photo(MAIN_CHANNEL_ID, photo, caption=text)
-            else:
-                await bot.send_message(MAIN_CHANNEL_ID, text)
-        except Exception as e:
-            logger.error(f"Ошибка публикации поста #{post_id} в канал: {e}")
-            return await cb.answer(f"Ошибка публикации: {e}", show_alert=True)
-        
-        await db.execute(
-            "UPDATE posts SET status='published', moderator_id=?, moderation_time=? WHERE id=?",
-            (cb.from_user.id, str(datetime.now()), post_id)
-        )
-        await db.commit()
-        
-        await update_admin_message_status(post_id, "published")
-        
-        try:
-            await bot.send_message(
-                user_id,
-                "🎉 Ваш пост был опубликован в канале!"
-            )
-        except Exception as e:
-            logger.warning(f"Не удалось уведомить пользователя {user_id}: {e}")
+    text, photo, user_id = row
+    
+    try:
+        if photo:
+            await bot.send_photo(MAIN_CHANNEL_ID, photo, caption=text, parse_mode=None)
+        else:
+            await bot.send_message(MAIN_CHANNEL_ID, text, parse_mode=None)
+    except Exception as e:
+        logger.error("Ошибка публикации поста #%s в канал: %s", post_id, e)
+        await release_post(post_id)
+        return await cb.answer(f"Ошибка публикации: {e}", show_alert=True)
+    
+    user_notifier.enqueue(user_id, "🎉 Ваш пост был опубликован в канале!")
+    await update_admin_message_status(post_id, "published")
     
-    await log("admin_publish", f"admin {cb.from_user.id} published post #{post_id}")
+    log("admin_publish", f"admin {cb.from_user.id} published post #{post_id}")
     
     await cb.message.edit_text(
         f"✅ Пост #{post_id} успешно опубликован!",
@@ -2804,35 +3258,25 @@ async def admin_publish_confirm(cb: CallbackQuery, state: FSMContext):
     )
     await state.clear()
 
-@dp.callback_query(F.data == "admin_publish_cancel")
+@admin_router.callback_query(F.data == "admin_publish_cancel")
 async def admin_publish_cancel(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.clear()
     await show_pending_posts_page(cb, page=1)
 
 # ================== АДМИНСКОЕ ОТКЛОНЕНИЕ ПОСТА ==================
-@dp.callback_query(F.data == "admin_reject_post")
+@admin_router.callback_query(F.data == "admin_reject_post")
 async def admin_reject_post(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(AdminPostState.wait_post_id_for_reject)
     await cb.message.edit_text(
         "📝 <b>Отклонение поста</b>\n\n"
         "Введите номер поста, который хотите отклонить:",
-        parse_mode='HTML',
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="⬅️ Назад", callback_data="pending_posts")]
         ])
     )
 
-@dp.message(AdminPostState.wait_post_id_for_reject)
+@admin_router.message(AdminPostState.wait_post_id_for_reject)
 async def process_admin_reject_post_id(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     try:
         post_id = int(msg.text.strip())
     except ValueError:
@@ -2869,23 +3313,18 @@ async def process_admin_reject_post_id(msg: Message, state: FSMContext):
         await msg.answer_photo(
             photo=post[3],
             caption=preview_text,
-            parse_mode='HTML',
             reply_markup=admin_post_confirm_keyboard(post_id, "reject")
         )
     else:
         await msg.answer(
             preview_text,
-            parse_mode='HTML',
             reply_markup=admin_post_confirm_keyboard(post_id, "reject")
         )
 
-@dp.callback_query(F.data.startswith("admin_reject_confirm_"))
+@admin_router.callback_query(F.data.startswith(CB_ADMIN_REJECT_CONFIRM))
 async def admin_reject_confirm(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        post_id = int(cb.data.split("_")[3])
+        post_id = int(cb.data.removeprefix(CB_ADMIN_REJECT_CONFIRM))
     except (ValueError, IndexError):
         return await cb.answer("❌ Неверный ID поста", show_alert=True)
     
@@ -2906,17 +3345,13 @@ async def admin_reject_confirm(cb: CallbackQuery, state: FSMContext):
     await cb.message.edit_text(
         f"📝 <b>Причина отклонения поста #{post_id}</b>\n\n"
         "Напишите причину, которая будет отправлена автору:",
-        parse_mode='HTML',
         reply_markup=InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="❌ Отмена", callback_data="admin_reject_cancel")]
         ])
     )
 
-@dp.message(AdminPostState.wait_reject_reason)
+@admin_router.message(AdminPostState.wait_reject_reason)
 async def process_reject_reason(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     data = await state.get_data()
     post_id = data.get("post_id")
     
@@ -2948,34 +3383,29 @@ async def process_reject_reason(msg: Message, state: FSMContext):
         await msg.answer_photo(
             photo=post[3],
             caption=preview_text,
-            parse_mode='HTML',
             reply_markup=admin_reject_reason_confirm_keyboard(post_id)
         )
     else:
         await msg.answer(
             preview_text,
-            parse_mode='HTML',
             reply_markup=admin_reject_reason_confirm_keyboard(post_id)
         )
     
     await state.set_state(AdminPostState.wait_reject_confirm)
 
-@dp.callback_query(F.data.startswith("admin_reject_send_"))
+@admin_router.callback_query(F.data.startswith(CB_ADMIN_REJECT_SEND))
 async def admin_reject_send(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     try:
-        post_id = int(cb.data.split("_")[3])
+        post_id = int(cb.data.removeprefix(CB_ADMIN_REJECT_SEND))
     except (ValueError, IndexError):
         return await cb.answer("❌ Неверный ID поста", show_alert=True)
     
     data = await state.get_data()
     reason = data.get("reject_reason")
     
-    post = await get_post_by_id(post_id)
+    user_id = await claim_post_for_reject(post_id, cb.from_user.id, reason)
     
-    if not post or post[5] != "moderation":
+    if user_id is None:
         await state.clear()
         return await cb.message.edit_text(
             "❌ Пост уже был обработан другим администратором.",
@@ -2984,26 +3414,15 @@ async def admin_reject_send(cb: CallbackQuery, state: FSMContext):
             ])
         )
     
-    async with aiosqlite.connect(DB_NAME) as db:
-        await db.execute(
-            "UPDATE posts SET status='rejected', moderator_id=?, moderation_time=?, reject_reason=? WHERE id=?",
-            (cb.from_user.id, str(datetime.now()), reason, post_id)
-        )
-        await db.commit()
-        await update_admin_message_status(post_id, "rejected", reason)
-    
-    try:
-        await bot.send_message(
-            post[1],
-            f"❌ Ваш пост #{post_id} отклонён.\n\n"
-            f"📝 <b>Причина:</b> {reason}\n\n"
-            f"👮 <b>Администратор:</b> @{cb.from_user.username or 'без username'}",
-            parse_mode='HTML'
-        )
-    except Exception as e:
-        logger.warning(f"Не удалось уведомить пользователя {post[1]}: {e}")
+    user_notifier.enqueue(
+        user_id,
+        f"❌ Ваш пост #{post_id} отклонён.\n\n"
+        f"📝 <b>Причина:</b> {reason}\n\n"
+        f"👮 <b>Администратор:</b> @{cb.from_user.username or 'без username'}"
+    )
+    await update_admin_message_status(post_id, "rejected", reason)
     
-    await log("admin_reject", f"admin {cb.from_user.id} rejected post #{post_id}: {reason}")
+    log("admin_reject", f"admin {cb.from_user.id} rejected post #{post_id}: {reason}")
     
     await cb.message.edit_text(
         f"✅ Пост #{post_id} отклонен. Причина отправлена пользователю.",
@@ -3014,11 +3433,8 @@ async def admin_reject_send(cb: CallbackQuery, state: FSMContext):
     )
     await state.clear()
 
-@dp.callback_query(F.data == "admin_reject_cancel")
+@admin_router.callback_query(F.data == "admin_reject_cancel")
 async def admin_reject_cancel(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.clear()
     await show_pending_posts_page(cb, page=1)
 
@@ -3068,12 +3484,9 @@ def message_to_html(text: str, entities: list = None) -> str:
     
     return html_text
 
-@dp.callback_query(F.data == "broadcast")
+@admin_router.callback_query(F.data == "broadcast")
 async def broadcast_menu_handler(cb: CallbackQuery):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
-    users_count = await get_users_count()
+    users_count = USERS_COUNT
     
     text = (
         f"📢 <b>Рассылка сообщений</b>\n\n"
@@ -3081,13 +3494,10 @@ async def broadcast_menu_handler(cb: CallbackQuery):
         f"<i>Выберите тип рассылки:</i>"
     )
     
-    await cb.message.edit_text(text, parse_mode='HTML', reply_markup=broadcast_menu())
+    await cb.message.edit_text(text, reply_markup=broadcast_menu())
 
-@dp.callback_query(F.data == "broadcast_text")
+@admin_router.callback_query(F.data == "broadcast_text")
 async def broadcast_text_handler(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(BroadcastState.wait_broadcast_text)
     await cb.message.edit_text(
         "📝 <b>Текстовая рассылка</b>\n\n"
@@ -3101,15 +3511,11 @@ async def broadcast_text_handler(cb: CallbackQuery, state: FSMContext):
         "• <s>Зачеркнутый</s>\n"
         "• <code>Моноширинный</code>\n\n"
         "📤 <i>Отправьте сообщение в том виде, в котором оно должно быть отправлено пользователям:</i>",
-        parse_mode='HTML',
         reply_markup=broadcast_cancel_menu()
     )
 
-@dp.message(BroadcastState.wait_broadcast_text)
+@admin_router.message(BroadcastState.wait_broadcast_text)
 async def process_broadcast_text(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     if not msg.text and not msg.caption:
         return await msg.answer("❌ Сообщение не содержит текста.")
     
@@ -3126,11 +3532,8 @@ async def process_broadcast_text(msg: Message, state: FSMContext):
     
     await show_broadcast_preview(msg, state)
 
-@dp.callback_query(F.data == "broadcast_photo")
+@admin_router.callback_query(F.data == "broadcast_photo")
 async def broadcast_photo_handler(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.set_state(BroadcastState.wait_broadcast_photo)
     await cb.message.edit_text(
         "📷 <b>Рассылка с фото</b>\n\n"
@@ -3140,15 +3543,11 @@ async def broadcast_photo_handler(cb: CallbackQuery, state: FSMContext):
         "2. Вы отправите текст с форматированием\n"
         "3. Бот автоматически определит все гиперссылки и премиум эмодзи\n\n"
         "📤 <i>Отправьте фото:</i>",
-        parse_mode='HTML',
         reply_markup=broadcast_cancel_menu()
     )
 
-@dp.message(BroadcastState.wait_broadcast_photo)
+@admin_router.message(BroadcastState.wait_broadcast_photo)
 async def process_broadcast_photo(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     if not msg.photo:
         return await msg.answer("❌ Пожалуйста, отправьте фото.")
     
@@ -3165,15 +3564,11 @@ async def process_broadcast_photo(msg: Message, state: FSMContext):
         "• С премиум эмодзи\n"
         "• С форматированием\n\n"
         "📤 <i>Отправьте текст:</i>",
-        parse_mode='HTML',
         reply_markup=broadcast_cancel_menu()
     )
 
-@dp.message(BroadcastState.wait_broadcast_text_with_photo)
+@admin_router.message(BroadcastState.wait_broadcast_text_with_photo)
 async def process_broadcast_text_with_photo(msg: Message, state: FSMContext):
-    if msg.from_user.id not in ADMINS:
-        return
-    
     if not msg.text and not msg.caption:
         return await msg.answer("❌ Сообщение не содержит текста.")
     
@@ -3197,7 +3592,7 @@ async def show_broadcast_preview(msg: Message, state: FSMContext):
     broadcast_entities = data.get("broadcast_entities")
     broadcast_photo = data.get("broadcast_photo")
     
-    users_count = await get_users_count()
+    users_count = USERS_COUNT
     
     preview_header = (
         f"📢 <b>Предпросмотр рассылки</b>\n\n"
@@ -3209,32 +3604,27 @@ async def show_broadcast_preview(msg: Message, state: FSMContext):
         if broadcast_type == "photo" and broadcast_photo:
             await msg.answer_photo(
                 photo=broadcast_photo,
-                caption=preview_header + "\n" + broadcast_text,
-                parse_mode='HTML'
+                caption=preview_header + "\n" + broadcast_text
             )
         else:
-            await msg.answer(preview_header, parse_mode='HTML')
-            await msg.answer(broadcast_text, entities=broadcast_entities)
+            await msg.answer(preview_header)
+            await msg.answer(broadcast_text, entities=broadcast_entities, parse_mode=None)
     except Exception as e:
-        logger.error(f"Ошибка при предпросмотре: {e}")
+        logger.error("Ошибка при предпросмотре: %s", e)
         try:
-            await msg.answer(preview_header + "\n" + broadcast_html, parse_mode='HTML')
+            await msg.answer(preview_header + "\n" + broadcast_html)
         except:
-            await msg.answer(f"{preview_header}\n{broadcast_text}")
+            await msg.answer(f"{preview_header}\n{broadcast_text}", parse_mode=None)
     
     await msg.answer(
         "👇 <b>Подтвердите рассылку:</b>",
-        parse_mode='HTML',
         reply_markup=broadcast_confirm_menu()
     )
     
     await state.set_state(BroadcastState.wait_broadcast_confirm)
 
-@dp.callback_query(F.data == "broadcast_start")
+@admin_router.callback_query(F.data == "broadcast_start")
 async def start_broadcast(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     data = await state.get_data()
     broadcast_type = data.get("broadcast_type")
     broadcast_text = data.get("broadcast_text")
@@ -3260,8 +3650,7 @@ async def start_broadcast(cb: CallbackQuery, state: FSMContext):
         f"👥 Всего пользователей: {total_users}\n"
         f"✅ Отправлено: 0/{total_users}\n"
         f"❌ Ошибок: 0\n"
-        f"⏳ Прогресс: 0%",
-        parse_mode='HTML'
+        f"⏳ Прогресс: 0%"
     )
     
     await cb.answer()
@@ -3276,32 +3665,32 @@ async def start_broadcast(cb: CallbackQuery, state: FSMContext):
                     chat_id=user_id,
                     photo=broadcast_photo,
                     caption=broadcast_text,
-                    caption_entities=broadcast_entities
+                    caption_entities=broadcast_entities,
+                    parse_mode=None
                 )
             else:
                 await bot.send_message(
                     chat_id=user_id,
                     text=broadcast_text,
-                    entities=broadcast_entities
+                    entities=broadcast_entities,
+                    parse_mode=None
                 )
             success_count += 1
         except Exception as e:
             error_count += 1
-            logger.error(f"Ошибка отправки рассылки пользователю {user_id}: {e}")
+            logger.error("Ошибка отправки рассылки пользователю %s: %s", user_id, e)
             
             try:
                 if broadcast_type == "photo" and broadcast_photo:
                     await bot.send_photo(
                         chat_id=user_id,
                         photo=broadcast_photo,
-                        caption=broadcast_html,
-                        parse_mode='HTML'
+                        caption=broadcast_html
                     )
                 else:
                     await bot.send_message(
                         chat_id=user_id,
-                        text=broadcast_html,
-                        parse_mode='HTML'
+                        text=broadcast_html
                     )
                 success_count += 1
                 error_count -= 1
@@ -3314,12 +3703,14 @@ async def start_broadcast(cb: CallbackQuery, state: FSMContext):
                         await bot.send_photo(
                             chat_id=user_id,
                             photo=broadcast_photo,
-                            caption=clean_text
+                            caption=clean_text,
+                            parse_mode=None
                         )
                     else:
                         await bot.send_message(
                             chat_id=user_id,
-                            text=clean_text
+                            text=clean_text,
+                            parse_mode=None
                         )
                     success_count += 1
                     error_count -= 1
@@ -3334,8 +3725,7 @@ async def start_broadcast(cb: CallbackQuery, state: FSMContext):
                     f"👥 Всего пользователей: {total_users}\n"
                     f"✅ Отправлено: {success_count}/{total_users}\n"
                     f"❌ Ошибок: {error_count}\n"
-                    f"⏳ Прогресс: {progress}%",
-                    parse_mode='HTML'
+                    f"⏳ Прогресс: {progress}%"
                 )
             except:
                 pass
@@ -3349,27 +3739,33 @@ async def start_broadcast(cb: CallbackQuery, state: FSMContext):
         f"❌ Ошибок: {error_count}\n"
         f"📊 Процент успеха: {int((success_count/total_users)*100)}%\n\n"
         f"📝 Текст рассылки:\n{broadcast_text[:100]}{'...' if len(broadcast_text) > 100 else ''}",
-        parse_mode='HTML',
         reply_markup=admin_menu()
     )
     
-    await log("broadcast", f"admin {cb.from_user.id}: {success_count}/{total_users} успешно")
+    log("broadcast", f"admin {cb.from_user.id}: {success_count}/{total_users} успешно")
     await state.clear()
 
-@dp.callback_query(F.data == "broadcast_cancel")
+@admin_router.callback_query(F.data == "broadcast_cancel")
 async def broadcast_cancel(cb: CallbackQuery, state: FSMContext):
-    if cb.from_user.id not in ADMINS:
-        return await cb.answer("🚫 У вас нет доступа.", show_alert=True)
-    
     await state.clear()
     await broadcast_menu_handler(cb)
 
 # ================== RUN ==================
 async def main():
-    logger.info("Запуск бота...")
-    await init_db()
-    logger.info("Бот запущен и готов к работе")
-    await dp.start_polling(bot)
+    log_listener = start_queue_logging()
+    try:
+        logger.info("Запуск бота...")
+        await init_db()
+        moderator_notifier.start()
+        user_notifier.start()
+        dp.shutdown.register(moderator_notifier.stop)
+        dp.shutdown.register(user_notifier.stop)
+        dp.shutdown.register(close_db)
+        logger.info("Бот запущен и готов к работе")
+        await dp.start_polling(bot)
+    finally:
+        # Дописываем накопившиеся в очереди записи
+        log_listener.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -20,7 +20,8 @@ ADMINS_TOPIC_ID = int(os.getenv("ADMINS_TOPIC_ID", "76774"))
 
 # Parse admin IDs from comma-separated string
 ADMINS_STR = os.getenv("ADMINS", "6702947726,1171717255")
-ADMINS = [int(uid.strip()) for uid in ADMINS_STR.split(",") if uid.strip()] if ADMINS_STR else []
+# frozenset: membership is checked on every update
+ADMINS = frozenset(int(uid.strip()) for uid in ADMINS_STR.split(",") if uid.strip())
 MODERATORS = []
 
 DB_NAME = os.getenv("DB_NAME", "smotrbot.db")